@@ -0,0 +1,367 @@
+"""CSC111 Final Project: Exploring Using Graph Based Data Structures to Implement a Connect 4 AI
+
+Module Description
+==================
+
+This module contains a benchmark suite that times the parts of the project where speed matters
+the most:
+    - the Board methods the AI calls for every board it searches
+    - AIPlayerComplex.make_move at depths 4 to 8, on a fixed set of boards
+    - the same searches split between a pool of processes, on machines with more than one core
+    - loading each of the opening books in data/opening_books
+    - how many games between two RandomPlayers connect4.run_game can play each second
+
+The boards and random moves come from fixed seeds, so every run does exactly the same work. Each
+benchmark is timed several times and the fastest time is kept, as the slower times are usually
+caused by other programs running at the same time. The searches also record how many boards they
+visited, which does not depend on the machine at all, so a change that makes the search visit
+more boards can be seen even when comparing results from different machines.
+
+The results are saved as a JSON file. If a baseline file from an earlier run is given, each
+result is compared to it, and any benchmark that got slower by more than the threshold, or whose
+search visited a different number of boards, is reported as a regression. For example:
+
+    python benchmark.py --output baseline.json
+    (make some changes)
+    python benchmark.py --output new.json --baseline baseline.json
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) 2021 Brian Cho and Luke Avveduto
+"""
+from typing import Callable, Optional
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sys
+import time
+from board import Board
+from connect4 import run_game
+from players import AIPlayerComplex, RandomPlayer
+import opening_book_gen
+
+# The seed the benchmark boards are made from, the number of boards, and the number of random
+# moves made to reach each of them
+_SEED = 111
+_POSITION_COUNT = 4
+_POSITION_PLIES = 8
+
+# The number of times each benchmark is timed, and the number of random games played for the
+# run_game benchmark
+_REPEATS = 5
+_GAMES = 500
+
+# The fraction slower than the baseline a benchmark can be before it is reported as a regression
+_DEFAULT_THRESHOLD = 0.25
+
+# The directory of the opening books that are timed
+_OPENING_BOOK_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                       'data', 'opening_books')
+
+
+def run_benchmarks(depths: range = range(4, 9), repeats: int = _REPEATS) -> dict:
+    """Run every benchmark and return the results, in the format saved by main. Each result
+    maps the name of a benchmark to a dict with the best number of seconds it took, and the
+    number of boards searched for the search benchmarks.
+
+    The search benchmarks are run once for each depth in 'depths'.
+
+    Preconditions:
+        - all(depth >= 1 for depth in depths)
+        - repeats >= 1
+    """
+    results = {}
+    results.update(benchmark_board(repeats))
+    results.update(benchmark_search(depths, repeats))
+    if (os.cpu_count() or 1) > 1:
+        results.update(benchmark_parallel_search(depths, min(os.cpu_count(), 4)))
+    results.update(benchmark_opening_books(repeats))
+    results.update(benchmark_games(repeats))
+    return {'machine': {'python': sys.version.split()[0], 'platform': platform.platform(),
+                        'processor': platform.processor(),
+                        'date': datetime.datetime.now().isoformat(timespec='seconds')},
+            'results': results}
+
+
+def benchmark_board(repeats: int) -> dict[str, dict]:
+    """Return the time taken by each of the Board methods used in the search, for one call.
+
+    make_move and un_move are timed by playing and undoing every move of a fixed random game, so
+    that boards at every stage of the game are included. The other methods are timed on the
+    benchmark boards.
+    """
+    moves = _random_game(random.Random(_SEED))
+    positions = benchmark_positions()
+    results = {}
+
+    for incremental_eval in (True, False):
+        suffix = '' if incremental_eval else ' (incremental_eval=False)'
+        make_times, un_times = [], []
+        for _ in range(repeats):
+            board = Board(incremental_eval=incremental_eval)
+            start = time.perf_counter()
+            for move in moves:
+                board.make_move(move)
+            middle = time.perf_counter()
+            for move in reversed(moves):
+                board.un_move(move)
+            make_times.append((middle - start) / len(moves))
+            un_times.append((time.perf_counter() - middle) / len(moves))
+        results['board.make_move' + suffix] = {'seconds': min(make_times)}
+        results['board.un_move' + suffix] = {'seconds': min(un_times)}
+
+        boards = [_play(moves, incremental_eval) for moves in positions]
+        results['board.evaluate_score' + suffix] = {
+            'seconds': _best_time(lambda: [board.evaluate_score(1) for board in boards],
+                                  1000, repeats) / len(boards)}
+
+    # _check_winner is private, but it is timed on its own as make_move calls it every move
+    boards = [_play(moves, True) for moves in positions]
+    results['board._check_winner'] = {
+        'seconds': _best_time(lambda: [board._check_winner() for board in boards],
+                              1000, repeats) / len(boards)}
+    return results
+
+
+def benchmark_search(depths: range, repeats: int) -> dict[str, dict]:
+    """Return the total time AIPlayerComplex.make_move takes to choose a move on every benchmark
+    board at each depth in depths, and the total number of boards it searched. A new player is
+    created for each board, so that each search starts with an empty transposition table.
+    """
+    results = {}
+    for depth in depths:
+        best, nodes = None, 0
+        for _ in range(repeats if depth < 8 else 1):
+            total, nodes = 0, 0
+            for moves in benchmark_positions():
+                board = _play(moves, True)
+                player = AIPlayerComplex(depth=depth, endgame_threshold=0, collect_stats=True)
+                start = time.perf_counter()
+                player.make_move(board)
+                total += time.perf_counter() - start
+                nodes += player.last_stats.nodes
+            best = total if best is None else min(best, total)
+        results[f'search.depth_{depth}'] = {'seconds': best, 'nodes': nodes}
+    return results
+
+
+def benchmark_parallel_search(depths: range, workers: int) -> dict[str, dict]:
+    """Return the total time AIPlayerComplex.make_move takes to choose a move on every benchmark
+    board at each depth in depths, when its search is split between 'workers' processes. Each
+    search is timed once, as the pool is slow to start, and the number of boards searched is not
+    recorded, as it depends on how the processes happen to share the transposition table.
+
+    Preconditions:
+        - workers >= 2
+    """
+    results = {}
+    for depth in depths:
+        total = 0
+        for moves in benchmark_positions():
+            board = _play(moves, True)
+            player = AIPlayerComplex(depth=depth, endgame_threshold=0, workers=workers)
+            # The processes in the pool are only started once they are needed, so each of them is
+            # given something to wait on before the search is timed
+            list(player._pool.map(time.sleep, [0.1] * workers))
+            start = time.perf_counter()
+            player.make_move(board)
+            total += time.perf_counter() - start
+        results[f'search.depth_{depth} (workers={workers})'] = {'seconds': total}
+    return results
+
+
+def benchmark_opening_books(repeats: int) -> dict[str, dict]:
+    """Return the time taken to load each opening book in data/opening_books with
+    opening_book_gen.load_opening_book, and to open each binary book with BinaryOpeningBook.
+    """
+    results = {}
+    for name in sorted(os.listdir(_OPENING_BOOK_DIRECTORY)):
+        path = os.path.join(_OPENING_BOOK_DIRECTORY, name)
+        if name.endswith('.csv') or name.endswith('.bin'):
+            results['book.load ' + name] = {
+                'seconds': _best_time(lambda: opening_book_gen.load_opening_book(path), 1,
+                                      repeats)}
+        if name.endswith('.bin'):
+            results['book.open ' + name] = {
+                'seconds': _best_time(lambda: opening_book_gen.BinaryOpeningBook(path), 1,
+                                      repeats)}
+    return results
+
+
+def benchmark_games(repeats: int) -> dict[str, dict]:
+    """Return the time connect4.run_game takes to play one game between two RandomPlayers."""
+    player = RandomPlayer()
+
+    def play_games() -> None:
+        random.seed(_SEED)
+        for _ in range(_GAMES):
+            run_game(player, player)
+
+    return {'games.run_game (random)': {'seconds': _best_time(play_games, 1, repeats) / _GAMES}}
+
+
+def benchmark_positions() -> list[list[int]]:
+    """Return the moves that reach each of the benchmark boards. These are always the same.
+
+    >>> benchmark_positions() == benchmark_positions()
+    True
+    """
+    rng = random.Random(_SEED)
+    positions = []
+    while len(positions) < _POSITION_COUNT:
+        moves = _random_game(rng)[:_POSITION_PLIES]
+        board = _play(moves, False)
+        # Boards that can be won straight away are skipped, as they take no time to search
+        if len(moves) == _POSITION_PLIES and board.get_winner() is None \
+                and not board.get_winning_moves():
+            positions.append(moves)
+    return positions
+
+
+def compare_results(results: dict, baseline: dict,
+                    threshold: float = _DEFAULT_THRESHOLD) -> list[str]:
+    """Return a description of every regression in 'results' compared to 'baseline', which are
+    both in the format returned by run_benchmarks. A benchmark has regressed if it took more than
+    threshold times longer than in the baseline, or if it searched a different number of boards.
+    Benchmarks that are not in both of them are ignored.
+
+    >>> old = {'results': {'a': {'seconds': 1.0, 'nodes': 10}, 'b': {'seconds': 1.0}}}
+    >>> new = {'results': {'a': {'seconds': 1.0, 'nodes': 12}, 'b': {'seconds': 1.5}}}
+    >>> compare_results(new, old)
+    ['a: searched 12 boards instead of 10', 'b: 1.50x slower (1.0 s -> 1.5 s)']
+    """
+    regressions = []
+    for name, result in results['results'].items():
+        if name not in baseline['results']:
+            continue
+        old = baseline['results'][name]
+        if 'nodes' in result and 'nodes' in old and result['nodes'] != old['nodes']:
+            regressions.append(f'{name}: searched {result["nodes"]} boards instead of '
+                               f'{old["nodes"]}')
+        ratio = result['seconds'] / old['seconds']
+        if ratio > 1 + threshold:
+            regressions.append(f'{name}: {ratio:.2f}x slower ({_format_time(old["seconds"])} -> '
+                               f'{_format_time(result["seconds"])})')
+    return regressions
+
+
+def print_results(results: dict, baseline: Optional[dict] = None) -> None:
+    """Print a table of every result, and how it compares to the baseline if one is given."""
+    width = max(len(name) for name in results['results'])
+    for name, result in results['results'].items():
+        line = f'{name:<{width}}  {_format_time(result["seconds"]):>10}'
+        if 'nodes' in result:
+            line += f'  {result["nodes"]:>9} nodes'
+        if baseline is not None and name in baseline['results']:
+            line += f'  ({result["seconds"] / baseline["results"][name]["seconds"]:.2f}x baseline)'
+        print(line)
+
+
+def _best_time(function: Callable[[], object], number: int, repeats: int) -> float:
+    """Return the fewest seconds that calling 'function' 'number' times in a row took, out of
+    'repeats' tries, divided by number.
+    """
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / number
+
+
+def _random_game(rng: random.Random) -> list[int]:
+    """Return the moves of a game where both players make random moves chosen with rng."""
+    board = Board(incremental_eval=False)
+    moves = []
+    while board.get_winner() is None:
+        move = rng.choice(board.get_valid_moves())
+        board.make_move(move)
+        moves.append(move)
+    return moves
+
+
+def _play(moves: list[int], incremental_eval: bool) -> Board:
+    """Return a new Board with 'moves' made on it."""
+    board = Board(incremental_eval=incremental_eval)
+    for move in moves:
+        board.make_move(move)
+    return board
+
+
+def _format_time(seconds: float) -> str:
+    """Return 'seconds' as a string in the most readable unit.
+
+    >>> _format_time(0.0000025)
+    '2.50 us'
+    """
+    if seconds < 1e-3:
+        return f'{seconds * 1e6:.2f} us'
+    elif seconds < 1:
+        return f'{seconds * 1e3:.2f} ms'
+    return f'{seconds:.1f} s'
+
+
+def main(args: Optional[list[str]] = None) -> None:
+    """Run the benchmarks with the command line arguments 'args', or the ones the program was
+    run with if args is None. Run with --help for a description of them. Exits with status 1 if
+    any regressions were found.
+    """
+    parser = argparse.ArgumentParser(description='Time the board, search and opening books.')
+    parser.add_argument('--output', default=None, help='the JSON file to save the results to')
+    parser.add_argument('--baseline', default=None,
+                        help='a JSON file saved by an earlier run to compare the results to')
+    parser.add_argument('--threshold', type=float, default=_DEFAULT_THRESHOLD,
+                        help='how much slower than the baseline counts as a regression '
+                             '(default: 0.25, which is 25%%)')
+    parser.add_argument('--max-depth', type=int, default=8,
+                        help='the deepest search to time, from 4 (default: 8)')
+    parser.add_argument('--repeats', type=int, default=_REPEATS,
+                        help='the number of times each benchmark is timed')
+
+    arguments = parser.parse_args(args)
+    results = run_benchmarks(range(4, arguments.max_depth + 1), arguments.repeats)
+
+    baseline = None
+    if arguments.baseline is not None:
+        with open(arguments.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+    print_results(results, baseline)
+
+    if arguments.output is not None:
+        with open(arguments.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if baseline is not None:
+        regressions = compare_results(results, baseline, arguments.threshold)
+        for regression in regressions:
+            print('Regression: ' + regression)
+        if regressions:
+            sys.exit(1)
+        print('No regressions')
+
+
+if __name__ == '__main__':
+    # The doctests and python_ta are only run with --self-check, and any other arguments are
+    # passed to main, so that running the tool with no arguments still runs the tool
+    if sys.argv[1:] == ['--self-check']:
+        import doctest
+        doctest.testmod()
+
+        import python_ta
+        python_ta.check_all(config={
+            'extra-imports': ['typing', 'argparse', 'datetime', 'json', 'os', 'platform', 'random',
+                              'sys', 'time', 'board', 'connect4', 'players', 'opening_book_gen'],
+            # the names (strs) of imported modules
+            'allowed-io': ['print_results', 'main'],
+            # the names (strs) of functions that call print/open/input
+            'max-line-length': 100,
+            'disable': ['E1136']
+        })
+    else:
+        main()
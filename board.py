@@ -5,10 +5,29 @@ Module Description
 
 This module contains a class that represents the game board of a Connect4Game. The board
 handles most operations needed to run the game, such as calculating valid moves, making moves,
-and checking for the winner. The board itself is represented in a 2d numpy array. The class
-also uses Zobrist Hashing to represent a unique state of the game board as a hash. This is done
-using the bitwise XOR operation and two list of keys. For more information, see
-opening_book_gen.py
+and checking for the winner. The board itself is represented as a pair of 'bitboards', which are
+python ints whose bits each correspond to one slot on the board. The class also uses Zobrist
+Hashing to represent a unique state of the game board as a hash. This is done using the bitwise
+XOR operation and two list of keys. For more information, see opening_book_gen.py
+
+The bitboards use the following layout, where each number is the index of the bit that represents
+that slot. Every column has an extra bit on top of it (the 'sentinel' row) that is never filled,
+which stops four in a rows from wrapping around from the top of one column to the bottom of the
+next one when the bitboards are shifted:
+
+     6 13 20 27 34 41 48
+     5 12 19 26 33 40 47
+     4 11 18 25 32 39 46
+     3 10 17 24 31 38 45
+     2  9 16 23 30 37 44
+     1  8 15 22 29 36 43
+     0  7 14 21 28 35 42
+
+More information on this representation can be found here:
+https://github.com/denkspuren/BitboardC4/blob/master/BitboardDesign.md
+
+The module also contains BatchBoard, which stores many boards in numpy arrays of bitboards in the
+same layout, so that thousands of random games can be played at once.
 
 Copyright and Usage Information
 ===============================
@@ -17,8 +36,191 @@ This file is Copyright (c) 2021 Brian Cho and Luke Avveduto
 """
 from typing import Optional
 import csv
+import os
+import random
 import numpy as np
-from scipy.signal import convolve2d
+
+# The number of rows and columns on the board, and the number of bits used for each column
+# of the bitboards (one more than the number of rows because of the sentinel row)
+ROWS = 6
+COLUMNS = 7
+_COLUMN_BITS = ROWS + 1
+
+# The order that moves are returned by Board.get_valid_moves. This order is very important
+# for optimising alpha-beta pruning, as the moves in the centre are usually the best ones
+_MOVE_ORDER = (3, 2, 4, 5, 1, 0, 6)
+
+# A mask with a bit set for the bottom slot of every column, and a mask with a bit set for every
+# slot on the board (not including the sentinel row)
+_BOTTOM_MASK = sum(1 << (col * _COLUMN_BITS) for col in range(COLUMNS))
+_BOARD_MASK = _BOTTOM_MASK * ((1 << ROWS) - 1)
+
+# The bit index of the top slot of each column. A column is full once this slot is filled
+_TOP_INDEX = tuple(col * _COLUMN_BITS + ROWS - 1 for col in range(COLUMNS))
+
+# The csv files the Zobrist hash keys are stored in, and the seeds used to generate the keys
+# instead if those files are missing. For more information, see opening_book_gen.py
+_KEY_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              'data', 'Zobrist_Hash_Keys')
+RED_KEY_FILE = os.path.join(_KEY_DIRECTORY, 'Zobrist_red_key.csv')
+YELLOW_KEY_FILE = os.path.join(_KEY_DIRECTORY, 'Zobrist_yellow_key.csv')
+RED_KEY_SEED = 1
+YELLOW_KEY_SEED = 2
+
+
+def _read_hash_keys(file: str, seed: int) -> tuple[int, ...]:
+    """Return the Zobrist hash keys stored in the csv file 'file' as a tuple that maps the bit
+    index of each slot on the board to its key. The sentinel row has a key of 0.
+
+    If 'file' does not exist, the keys are generated by a random number generator seeded with
+    'seed' instead, so every process that generates them gets the same keys.
+
+    Preconditions:
+        - file is a csv file of 6 rows of 7 64 bit ints, or does not exist
+    """
+    keys = [0] * (COLUMNS * _COLUMN_BITS)
+    if os.path.exists(file):
+        with open(file) as csv_file:
+            reader = csv.reader(csv_file)
+            for row, values in enumerate(reader):
+                for col, value in enumerate(values):
+                    keys[col * _COLUMN_BITS + row] = int(value)
+    else:
+        generator = random.Random(seed)
+        for row in range(ROWS):
+            for col in range(COLUMNS):
+                keys[col * _COLUMN_BITS + row] = generator.getrandbits(64)
+    return tuple(keys)
+
+
+# The hash keys are only read once, when this module is first imported, and are then shared by
+# every Board. This makes creating a Board much faster, which matters when many are made
+_RED_HASH_KEYS = _read_hash_keys(RED_KEY_FILE, RED_KEY_SEED)
+_YELLOW_HASH_KEYS = _read_hash_keys(YELLOW_KEY_FILE, YELLOW_KEY_SEED)
+
+
+def _mirror_keys(keys: tuple[int, ...]) -> tuple[int, ...]:
+    """Return a tuple that maps the bit index of each slot on the board to the key in 'keys' of
+    the slot in the same row on the other side of the board. Using these keys instead of 'keys'
+    gives the hash the board would have if it was flipped from left to right.
+    """
+    return tuple(keys[(COLUMNS - 1 - index // _COLUMN_BITS) * _COLUMN_BITS + index % _COLUMN_BITS]
+                 for index in range(len(keys)))
+
+
+_RED_MIRROR_KEYS = _mirror_keys(_RED_HASH_KEYS)
+_YELLOW_MIRROR_KEYS = _mirror_keys(_YELLOW_HASH_KEYS)
+
+# The change in column and row between two neighbouring slots for each of the four directions a
+# four in a row can be made in: vertical, horizontal, diagonal going up and diagonal going down.
+# The shift between the bits of two neighbouring slots in each direction follows from them.
+_STEPS = ((0, 1), (1, 0), (1, 1), (1, -1))
+_DIRECTIONS = tuple(col_step * _COLUMN_BITS + row_step for col_step, row_step in _STEPS)
+
+
+def _window_starts(col_step: int, row_step: int) -> int:
+    """Return a mask of the slots where a four in a row going in the direction given by
+    'col_step' and 'row_step' can start so that all four of its slots are on the board.
+
+    Preconditions:
+        - (col_step, row_step) in _STEPS
+    """
+    starts = 0
+    for col in range(COLUMNS):
+        for row in range(ROWS):
+            if 0 <= col + 3 * col_step < COLUMNS and 0 <= row + 3 * row_step < ROWS:
+                starts |= 1 << (col * _COLUMN_BITS + row)
+    return starts
+
+
+_WINDOW_STARTS = tuple(_window_starts(col_step, row_step) for col_step, row_step in _STEPS)
+
+
+def _find_windows() -> list[int]:
+    """Return a list of every window of four slots in a row that fits on the board, as masks.
+    There are 69 of them.
+    """
+    windows = []
+    for i in range(len(_DIRECTIONS)):
+        for index in range(COLUMNS * _COLUMN_BITS):
+            if _WINDOW_STARTS[i] >> index & 1:
+                windows.append(sum(1 << (index + k * _DIRECTIONS[i]) for k in range(4)))
+    return windows
+
+
+# Every window of four slots in a row on the board, and a tuple that maps the bit index of each
+# slot to the indices in _WINDOWS of the windows that contain that slot
+_WINDOWS = tuple(_find_windows())
+_SLOT_WINDOWS = tuple(tuple(i for i in range(len(_WINDOWS)) if _WINDOWS[i] >> index & 1)
+                      for index in range(COLUMNS * _COLUMN_BITS))
+
+# The bit index of the top slot of each column and of every slot on the board, as numpy arrays
+# for BatchBoard. _SLOT_INDEX_ARRAY[row][col] is the index of the slot in that row and column
+_TOP_INDEX_ARRAY = np.array(_TOP_INDEX, dtype=np.uint64)
+_SLOT_INDEX_ARRAY = np.array([[col * _COLUMN_BITS + row for col in range(COLUMNS)]
+                              for row in range(ROWS)], dtype=np.uint64)
+
+
+def _has_four(stones: int) -> bool:
+    """Return whether the bitboard 'stones' contains a four in a row in any direction.
+    """
+    for direction in _DIRECTIONS:
+        pairs = stones & (stones >> direction)
+        if pairs & (pairs >> (2 * direction)):
+            return True
+    return False
+
+
+def _winning_cells(stones: int) -> int:
+    """Return a bitboard of every slot that would complete a four in a row for the pieces in
+    'stones' if a piece was placed in it. Slots that are already filled are not removed.
+
+    Every slot is checked at once by looking for three pieces in a row next to the slot on
+    either side of it, or two on one side and one on the other, in each direction.
+    """
+    # Vertically, the three pieces can only be underneath the slot
+    cells = (stones << 1) & (stones << 2) & (stones << 3)
+
+    for direction in _DIRECTIONS[1:]:
+        pairs = (stones << direction) & (stones << (2 * direction))
+        cells |= pairs & (stones << (3 * direction))
+        cells |= pairs & (stones >> direction)
+        pairs = (stones >> direction) & (stones >> (2 * direction))
+        cells |= pairs & (stones << direction)
+        cells |= pairs & (stones >> (3 * direction))
+
+    return cells & _BOARD_MASK
+
+
+def _count_lines(stones: int) -> (int, int):
+    """Return the number of windows of four slots in a row that contain exactly three of the
+    pieces in 'stones' and the number that contain exactly two of them, in that order.
+
+    The pieces in each window are counted for every window at once by adding up the four
+    shifted copies of the bitboard bit by bit, in the same way an adder circuit would. The
+    results for each direction are then packed next to each other in one int so that the
+    number of set bits only has to be counted once.
+    """
+    threes, twos = 0, 0
+    offset = 0
+    for i in range(4):
+        direction = _DIRECTIONS[i]
+        first = stones
+        second = stones >> direction
+        third = stones >> (2 * direction)
+        fourth = stones >> (3 * direction)
+
+        low_sum = first ^ second
+        low_carry = first & second
+        high_sum = third ^ fourth
+        high_carry = third & fourth
+        ones = low_sum ^ high_sum
+        twos_bit = low_carry ^ high_carry ^ (low_sum & high_sum)
+
+        threes |= (ones & twos_bit & _WINDOW_STARTS[i]) << offset
+        twos |= (twos_bit & ~ones & _WINDOW_STARTS[i]) << offset
+        offset += 64
+    return bin(threes).count('1'), bin(twos).count('1')
 
 
 class Board:
@@ -27,109 +229,192 @@ class Board:
 
     Representation Invariants:
         - all({move in {0, 1, 2, 3, 4, 5, 6} for move in self._valid_moves})
+        - self._position & ~self._mask == 0
+        - self._mask & ~_BOARD_MASK == 0
     """
     # Public Instance Attributes:
     #   - board_array: this is a numpy 2d array that stores the board as a 6 x 7 grid of 0's, 1's,
-    #     and -1's. A 0 is a blank space, a 1 is a red piece, and a -1 is a yellow piece.
+    #     and -1's. A 0 is a blank space, a 1 is a red piece, and a -1 is a yellow piece. The array
+    #     is only created from the bitboards when it is asked for, as the AI never needs it.
     #   - move_number: this is the number of moves that has been played so far/
     #   - hash: this is a hash for the board produced via the Zobrist hashing algorithm. A board
     #     that has the pieces in the same position will always have the same hash, regardless of
     #     what moves were made to get there. This is used as a key in a transposition table. More
     #     info on this can be found in opening_book_gen.py
+    #   - mirror_hash: this is the hash the board would have if it was flipped from left to right.
+    #     Flipping a board does not change how good it is, so the smaller of hash and mirror_hash
+    #     can be used as the key for both of them. See get_canonical_hash.
     # Private Instance Attributes:
+    #   - _position: this is a bitboard of the pieces belonging to the player whose turn it is.
+    #   - _mask: this is a bitboard of every slot on the board that has a piece in it.
+    #   - _heights: this is a list that maps a column to the bit index of the slot a piece placed
+    #     in that column will land in.
     #   - _valid_moves: this is a list of the moves that can be made in the boards current state. A
     #     'move' is one of the seven columns, numbered 0-6 inclusively. If a column is full, it is
-    #      no longer available and so it will not be present in this list
-    #   - _valid_move_order: this is a dict that maps columns to their original indices in
-    #      self._valid_more_order. This order is very important for optimising alpha-beta pruning.
-    #   - _column_to_row: this is dict that maps a column to what row in the array a piece placed in
-    #     that column in needs to be placed.
+    #      no longer available and so it will not be present in this list. The moves are always in
+    #      the order given by _MOVE_ORDER.
     #   - _is_red_active: this is a boolean that is True when it is red's turn and False when it is
     #     yellow's turn. Red goes first every game, and so this is True by default.
     #   - _win_state: this is 1 when the board is in a state where 4 has won, -1 if yellow has won,
     #     0 if it is draw, and None otherwise.
-    #   - _detection_kernels_red: this is a list of numpy arrays where each numpy array encodes
-    #     one of the four possible patterns you can create to win a game of connect 4. This list is
-    #     for red so all the elements are 1.
-    #   - _detection_kernels_yellow: The same as above but with every element being a -1 as it is
-    #     for yellow.
-    #   - _red_hash_keys: This is a 2d numpy array that, for each possible location of a piece on
-    #     board, a 64 bit number is stored. This is used to calculate a hash for the board using
-    #     Zobrist's hashing algorithm. This one contains the keys for all the possible places red
-    #     pieces can go. See opening_book_gen.py for more information.
+    #   - _red_hash_keys: This is a tuple that, for each possible location of a piece on the board,
+    #     stores a 64 bit number at the index of the bit for that location. This is used to
+    #     calculate a hash for the board using Zobrist's hashing algorithm. This one contains the
+    #     keys for all the possible places red pieces can go. It is shared by every Board. See
+    #     opening_book_gen.py for more information.
     #   - _yellow_hash_keys: Same as above but for the yellow pieces.
+    #   - _incremental_eval: this is True when the number of two and three in a rows each player
+    #     has is kept up to date every time a move is made or undone, so that evaluate_score only
+    #     has to look them up. When it is False, evaluate_score counts them from scratch instead.
+    #   - _red_window_counts: this is a list that maps the index of each window of four slots in
+    #     _WINDOWS to the number of red pieces in it. It is only kept up to date when
+    #     _incremental_eval is True.
+    #   - _yellow_window_counts: Same as above but for the yellow pieces.
+    #   - _red_lines: this is a list of the number of windows with exactly three red pieces in them
+    #     and the number with exactly two red pieces in them. It is only kept up to date when
+    #     _incremental_eval is True.
+    #   - _yellow_lines: Same as above but for the yellow pieces.
+    #   - _array_cache: this is a tuple of the bitboards board_array was last created from, and
+    #     the array that was created, so that it does not need to be recreated if no moves have
+    #     been made since.
 
-    board_array: np.array
     move_number: int
     hash: int
-    _valid_move_order: dict[int: int]
-    _red_hash_keys: np.array
-    _yellow_hash_keys: np.array
-    _column_to_row: dict[int: int]
+    mirror_hash: int
+    _position: int
+    _mask: int
+    _heights: list[int]
+    _red_hash_keys: tuple[int, ...]
+    _yellow_hash_keys: tuple[int, ...]
     _is_red_active: bool
     _valid_moves: list[int]
     _win_state: Optional[int]
-    _detection_kernels_red: list[np.array]
-    _detection_kernels_yellow: list[np.array]
-
-    def __init__(self, python_board: list[list[int]] = None, red_active: bool = True) -> None:
+    _incremental_eval: bool
+    _red_window_counts: list[int]
+    _yellow_window_counts: list[int]
+    _red_lines: list[int]
+    _yellow_lines: list[int]
+    _array_cache: Optional[tuple[int, int, np.array]]
+
+    def __init__(self, python_board: list[list[int]] = None, red_active: bool = True,
+                 incremental_eval: bool = True) -> None:
         """Creates a new instance of the Board class. By default, the board is initialised to a
         state of all zeros, meaning the board is blank and no moves has been played yet. However,
         this can be changed if you provide a argument 'python_board'
 
+        If incremental_eval is True, the counts used by evaluate_score are updated every time a
+        move is made or undone. Otherwise, they are counted from scratch every time
+        evaluate_score is called. Both give the exact same scores.
+
         Preconditions:
             - all({n in {-1, 0, 1} for n in row for row in python_board})
         """
+        self._is_red_active = red_active
+
+        # These are the hash keys for use in Zobrist hashing, for more information, see
+        # opening_book_gen.py. They are shared with every other Board, so they are not copied
+        self._red_hash_keys = _RED_HASH_KEYS
+        self._yellow_hash_keys = _YELLOW_HASH_KEYS
 
-        game_board = [[0, 0, 0, 0, 0, 0, 0],
-                      [0, 0, 0, 0, 0, 0, 0],
-                      [0, 0, 0, 0, 0, 0, 0],
-                      [0, 0, 0, 0, 0, 0, 0],
-                      [0, 0, 0, 0, 0, 0, 0],
-                      [0, 0, 0, 0, 0, 0, 0]]
+        self._position = 0
+        self._mask = 0
+        self._heights = [col * _COLUMN_BITS for col in range(COLUMNS)]
+        self.move_number = 0
+        self.hash = 0
+        self.mirror_hash = 0
+        self._array_cache = None
 
+        self._incremental_eval = incremental_eval
+        self._red_window_counts = [0] * len(_WINDOWS)
+        self._yellow_window_counts = [0] * len(_WINDOWS)
+        self._red_lines = [0, 0]
+        self._yellow_lines = [0, 0]
+
+        red_stones = 0
         if python_board is not None:
-            self.board_array = np.array(python_board)
+            for col in range(COLUMNS):
+                row = 0
+                while row < ROWS and python_board[row][col] != 0:
+                    index = col * _COLUMN_BITS + row
+                    self._mask |= 1 << index
+                    if python_board[row][col] == 1:
+                        red_stones |= 1 << index
+                        self.hash ^= self._red_hash_keys[index]
+                        self.mirror_hash ^= _RED_MIRROR_KEYS[index]
+                        _add_to_windows(index, self._red_window_counts, self._red_lines)
+                    else:
+                        self.hash ^= self._yellow_hash_keys[index]
+                        self.mirror_hash ^= _YELLOW_MIRROR_KEYS[index]
+                        _add_to_windows(index, self._yellow_window_counts, self._yellow_lines)
+                    self.move_number += 1
+                    row += 1
+                self._heights[col] = col * _COLUMN_BITS + row
+
+        if red_active:
+            self._position = red_stones
         else:
-            self.board_array = np.array(game_board)
+            self._position = self._mask ^ red_stones
 
-        self.move_number = 0
+        self._valid_moves = self._find_valid_moves()
 
-        # Creating the kernels to use in a 2d convolution to check the board for a winner later
-        across = np.array([[1, 1, 1, 1]])
-        vertical = np.transpose(across)
-        main_diagonal = np.eye(4, dtype=np.uint8)
-        off_diagonal = np.fliplr(main_diagonal)
-        self._detection_kernels_red = [across, vertical, main_diagonal, off_diagonal]
-        self._detection_kernels_yellow = [kernel * -1 for kernel in self._detection_kernels_red]
-
-        self._is_red_active = red_active
+        if _has_four(red_stones):
+            self._win_state = 1
+        elif _has_four(self._mask ^ red_stones):
+            self._win_state = -1
+        elif len(self._valid_moves) == 0:
+            self._win_state = 0
+        else:
+            self._win_state = None
 
-        # Matches moves to their indices in self._valid_moves, this order is very important
-        # for optimising alpha-beta pruning
-        self._valid_move_order = {3: 0, 2: 1, 4: 2, 5: 3, 1: 4, 0: 5, 6: 6}
-        self._valid_moves = [3, 2, 4, 5, 1, 0, 6]
-        self._column_to_row = {0: 0, 1: 0, 2: 0, 3: 0, 4: 0, 5: 0, 6: 0}
-
-        self._win_state = None
-
-        # This code reads in the hash keys for use in Zobrist hashing, for more information, see
-        # opening_book_gen.py
-        red_hash_keys = []
-        with open('data/Zobrist_Hash_Keys/Zobrist_red_key.csv') as file:
-            reader = csv.reader(file)
-            for row in reader:
-                red_hash_keys.append([int(r) for r in row])
-        self._red_hash_keys = np.array(red_hash_keys)
-
-        yellow_hash_keys = []
-        with open('data/Zobrist_Hash_Keys/Zobrist_yellow_key.csv') as file:
-            reader = csv.reader(file)
-            for row in reader:
-                yellow_hash_keys.append([int(r) for r in row])
-        self._yellow_hash_keys = np.array(yellow_hash_keys)
+    @property
+    def board_array(self) -> np.array:
+        """Return a 6 x 7 numpy array of the board where a 0 is a blank space, a 1 is a red piece,
+        and a -1 is a yellow piece. The first row of the array is the bottom row of the board.
+        """
+        if self._array_cache is not None and self._array_cache[0] == self._position \
+                and self._array_cache[1] == self._mask:
+            return self._array_cache[2]
 
-        self.hash = 0
+        if self._is_red_active:
+            red_stones = self._position
+        else:
+            red_stones = self._position ^ self._mask
+
+        array = np.zeros((ROWS, COLUMNS), dtype=int)
+        for col in range(COLUMNS):
+            for row in range(ROWS):
+                bit = 1 << (col * _COLUMN_BITS + row)
+                if red_stones & bit:
+                    array[row][col] = 1
+                elif self._mask & bit:
+                    array[row][col] = -1
+
+        self._array_cache = (self._position, self._mask, array)
+        return array
+
+    def copy(self) -> 'Board':
+        """Return a new Board in the exact same state as this one. Moves made on the new Board
+        do not affect this one, and the other way around.
+        """
+        new_board = Board.__new__(Board)
+        new_board.move_number = self.move_number
+        new_board.hash = self.hash
+        new_board.mirror_hash = self.mirror_hash
+        new_board._position = self._position
+        new_board._mask = self._mask
+        new_board._heights = self._heights.copy()
+        new_board._red_hash_keys = self._red_hash_keys
+        new_board._yellow_hash_keys = self._yellow_hash_keys
+        new_board._is_red_active = self._is_red_active
+        new_board._valid_moves = self._valid_moves.copy()
+        new_board._win_state = self._win_state
+        new_board._incremental_eval = self._incremental_eval
+        new_board._red_window_counts = self._red_window_counts.copy()
+        new_board._yellow_window_counts = self._yellow_window_counts.copy()
+        new_board._red_lines = self._red_lines.copy()
+        new_board._yellow_lines = self._yellow_lines.copy()
+        new_board._array_cache = None
+        return new_board
 
     def get_valid_moves(self) -> list[int]:
         """Return a list of the valid moves for the active player."""
@@ -144,6 +429,70 @@ class Board:
         If the game does not have a winner yet, return None"""
         return self._win_state
 
+    def get_active_player(self) -> int:
+        """Return 1 if it is red's turn to make a move and -1 if it is yellow's turn."""
+        return 1 if self._is_red_active else -1
+
+    def get_canonical_hash(self) -> tuple[int, bool]:
+        """Return the smaller of self.hash and self.mirror_hash, and whether it is the mirror
+        hash. A board and its mirror image have the same canonical hash, so they can share one
+        entry in a transposition table or opening book. A move stored for the mirrored board has
+        to be flipped (move becomes COLUMNS - 1 - move) before it is played on this one.
+        """
+        if self.mirror_hash < self.hash:
+            return self.mirror_hash, True
+        return self.hash, False
+
+    def get_winning_moves(self) -> list[int]:
+        """Return a list of the valid moves that would win the game for the active player, in
+        the same order as get_valid_moves. The board is not mutated.
+        """
+        # The slots that a piece can be placed in right now are the ones just above the top
+        # piece of each column
+        playable = (self._mask + _BOTTOM_MASK) & _BOARD_MASK
+        winning = _winning_cells(self._position) & playable
+        if winning == 0:
+            return []
+        return [move for move in self._valid_moves if winning >> self._heights[move] & 1]
+
+    def get_non_losing_moves(self) -> list[int]:
+        """Return a list of the valid moves that do not let the other player win on their next
+        move, in the same order as get_valid_moves. This is empty if every move loses, which
+        happens when the other player has two or more places they could win next move, or when
+        every place they could win is only playable after a piece is placed under it.
+
+        Preconditions:
+            - self.get_winning_moves() == []
+        """
+        playable = (self._mask + _BOTTOM_MASK) & _BOARD_MASK
+        opponent_wins = _winning_cells(self._position ^ self._mask) & ~self._mask
+
+        # If the other player can win next move, that slot has to be blocked. If there is more
+        # than one of them, they can not all be blocked
+        forced = playable & opponent_wins
+        if forced:
+            if forced & (forced - 1):
+                return []
+            playable = forced
+
+        # Placing a piece directly under a slot the other player wins with lets them play there
+        safe = playable & ~(opponent_wins >> 1)
+        return [move for move in self._valid_moves if safe >> self._heights[move] & 1]
+
+    def get_threat_count(self, color: int) -> int:
+        """Return the number of empty slots on the board that would complete a four in a row
+        for the player with the colour 'color' (1 for red, -1 for yellow), whether or not a
+        piece can be placed in them yet.
+
+        Preconditions:
+            - color in {-1, 1}
+        """
+        if (color == 1) == self._is_red_active:
+            stones = self._position
+        else:
+            stones = self._position ^ self._mask
+        return bin(_winning_cells(stones) & ~self._mask).count('1')
+
     def make_move(self, move: int) -> None:
         """Make the given move. This instance of Board will be mutated, and will
         afterwards represent the game state after move is made
@@ -164,18 +513,28 @@ class Board:
         Precondition:
             - previous_move must have been the last move played
         """
-        self._column_to_row[previous_move] -= 1
-        if self._column_to_row[previous_move] == 5:
-            self._valid_moves.insert(self._valid_move_order[previous_move], previous_move)
-        row = self._column_to_row[previous_move]
-        self.board_array[row][previous_move] = 0
+        index = self._heights[previous_move] - 1
+        self._heights[previous_move] = index
+        if index == _TOP_INDEX[previous_move]:
+            self._valid_moves = self._find_valid_moves()
+
+        # Taking the piece out of the mask then flipping the position gives back the pieces of the
+        # player who made previous_move
+        self._mask ^= 1 << index
+        self._position ^= self._mask
 
         self._is_red_active = not self._is_red_active
 
         if self._is_red_active:
-            self.hash = self.hash ^ int(self._red_hash_keys[row][previous_move])
+            self.hash = self.hash ^ self._red_hash_keys[index]
+            self.mirror_hash ^= _RED_MIRROR_KEYS[index]
+            if self._incremental_eval:
+                _remove_from_windows(index, self._red_window_counts, self._red_lines)
         else:
-            self.hash = self.hash ^ int(self._red_hash_keys[row][previous_move])
+            self.hash = self.hash ^ self._yellow_hash_keys[index]
+            self.mirror_hash ^= _YELLOW_MIRROR_KEYS[index]
+            if self._incremental_eval:
+                _remove_from_windows(index, self._yellow_window_counts, self._yellow_lines)
 
         if self._win_state is not None:
             self._win_state = None
@@ -187,45 +546,62 @@ class Board:
         Preconditions:
             - move in self._valid_moves
         """
-        row = self._column_to_row[move]  # Find what row to place the disk in
+        index = self._heights[move]  # Find what slot to place the disk in
         if self._is_red_active:
-            self.board_array[row][move] = 1
-            self.hash = self.hash ^ int(self._red_hash_keys[row][move])  # Update hash
+            self.hash = self.hash ^ self._red_hash_keys[index]  # Update hash
+            self.mirror_hash ^= _RED_MIRROR_KEYS[index]
+            if self._incremental_eval:
+                _add_to_windows(index, self._red_window_counts, self._red_lines)
         else:
-            self.board_array[row][move] = -1
-            self.hash = self.hash ^ int(self._yellow_hash_keys[row][move])  # # Update hash
+            self.hash = self.hash ^ self._yellow_hash_keys[index]  # Update hash
+            self.mirror_hash ^= _YELLOW_MIRROR_KEYS[index]
+            if self._incremental_eval:
+                _add_to_windows(index, self._yellow_window_counts, self._yellow_lines)
+
+        # After the move, _position needs to hold the pieces of the other player, which are the
+        # pieces in the mask that are not in the current position
+        self._position ^= self._mask
+        self._mask |= 1 << index
+
+        self._heights[move] = index + 1
+        if index == _TOP_INDEX[move]:
+            self._valid_moves = self._find_valid_moves()
 
-        self._column_to_row[move] += 1
-        if self._column_to_row[move] == 6:
-            self._valid_moves.remove(move)
+    def _find_valid_moves(self) -> list[int]:
+        """Return a list of the columns that are not full, in the order given by _MOVE_ORDER."""
+        return [move for move in _MOVE_ORDER if self._heights[move] <= _TOP_INDEX[move]]
 
     def _check_winner(self) -> Optional[int]:
-        """Checks whether the current game state has a winner
+        """Checks whether the current game state has a winner. This must be called after the
+        pieces have been placed by _update_board but before the active player is switched.
 
         If the game state is a tie, return 0
         If the game state represents a win for red, return 1
         If the game state represents a win for yellow, return -1
         If the game state does not have a winner, return None
         """
-
-        if self._is_red_active:
-            temp_board = self.board_array.clip(min=0, max=1)  # Turns all -1's into 0's
-            for kernel in self._detection_kernels_red:
-                # For each of the patterns that produce a win, do a 2d convolution on the copy
-                # of the board. If there 4's in the resulting array, one of the kernels found a
-                # match and so there is a 4 in a row somewhere. This is done this way to save
-                # as much time as possible, because optimisation is very important to the
-                # AI's performance and python is already quite slow
-                if np.any(convolve2d(temp_board, kernel, mode='valid') == 4):
-                    return 1
-        else:
-            temp_board = self.board_array.clip(min=-1, max=0)  # Turns all 1's into 0's
-            for kernel in self._detection_kernels_yellow:
-                # Same as before
-                if np.any(convolve2d(temp_board, kernel, mode='valid') == 4):
-                    return -1
-
-        if len(self._valid_moves) == 0:
+        # The pieces of the player that just moved
+        stones = self._position ^ self._mask
+
+        # Shifting the bitboard by a direction and AND-ing it with itself leaves the pieces that
+        # have a neighbour in that direction. Doing it again with twice the shift leaves the
+        # pieces that start a four in a row. This is done this way to save as much time as
+        # possible, because optimisation is very important to the AI's performance and python is
+        # already quite slow
+        pairs = stones & (stones >> 1)
+        if pairs & (pairs >> 2):
+            return 1 if self._is_red_active else -1
+        pairs = stones & (stones >> 7)
+        if pairs & (pairs >> 14):
+            return 1 if self._is_red_active else -1
+        pairs = stones & (stones >> 8)
+        if pairs & (pairs >> 16):
+            return 1 if self._is_red_active else -1
+        pairs = stones & (stones >> 6)
+        if pairs & (pairs >> 12):
+            return 1 if self._is_red_active else -1
+
+        if self._mask == _BOARD_MASK:
             return 0
 
         return None
@@ -253,36 +629,209 @@ class Board:
         # Score the board for how good it is for red
         # Positive if color is good
         # Negative if color is bad
-        num_three_red, num_two_red = 0, 0
-        red_board = self.board_array.clip(min=0, max=1)
-        for kernel in self._detection_kernels_red:
-            # Similar to what is done in _check_win, it looks for the patterns of
-            # two in a rows and tree in a rows.
-            convolved_arr = convolve2d(red_board, kernel, mode='valid')
-            num_three_red += np.count_nonzero(convolved_arr == 3)
-            num_two_red += np.count_nonzero(convolved_arr == 2)
-
-        num_three_yel, num_two_yel = 0, 0
-        yellow_board = self.board_array.clip(min=-1, max=0)
-        for kernel in self._detection_kernels_yellow:
-            # Same as above but for yellow
-            convolved_arr = convolve2d(yellow_board, kernel, mode='valid')
-            num_three_yel += np.count_nonzero(convolved_arr == 3)
-            num_two_yel += np.count_nonzero(convolved_arr == 2)
+        if self._incremental_eval:
+            # The number of windows of four slots that have two or three pieces of each colour
+            # in them are already known, as they are updated every move
+            num_three_red, num_two_red = self._red_lines
+            num_three_yel, num_two_yel = self._yellow_lines
+        else:
+            if self._is_red_active:
+                red_stones = self._position
+            else:
+                red_stones = self._position ^ self._mask
+
+            # Counts the windows of four slots that have two or three pieces of each colour in
+            # them, no matter what else is in the window
+            num_three_red, num_two_red = _count_lines(red_stones)
+            num_three_yel, num_two_yel = _count_lines(red_stones ^ self._mask)
 
         # This is our evaluation heuristic
         score = (num_three_red * 100 + num_two_red) - (num_three_yel * 100 + num_two_yel)
         return score * color
 
 
+class BatchBoard:
+    """A class representing many Connect 4 boards that are played at the same time, for playing
+    large numbers of random games quickly. The bitboards of every board are kept in numpy arrays,
+    so a move can be made on every board, and every board can be checked for a win, with a few
+    numpy operations instead of a python loop over the boards.
+
+    Every move made on a BatchBoard is made on all of its boards at once, so every board has the
+    same number of pieces on it, except for the boards whose games have ended. These are
+    'finished', and are no longer changed by any moves.
+
+    Representation Invariants:
+        - self.finished.shape == self.winners.shape == (self.n,)
+        - self._position.shape == self._mask.shape == (self.n,)
+        - self._heights.shape == (self.n, COLUMNS)
+        - not np.any(self.winners[~self.finished])
+    """
+    # Public Instance Attributes:
+    #   - n: this is the number of boards.
+    #   - move_number: this is the number of moves that have been made on the boards that are not
+    #     finished.
+    #   - finished: this is a numpy array of bools that is True for each board whose game has
+    #     ended.
+    #   - winners: this is a numpy array of the winner of each board: 1 if red has won, -1 if
+    #     yellow has won, and 0 if it is a draw or the game has not ended yet.
+    # Private Instance Attributes:
+    #   - _position: this is a numpy array of the bitboard of the pieces belonging to the player
+    #     whose turn it is on each board, in the same layout as Board._position. On finished
+    #     boards, this is the player whose turn it would be if the game had not ended.
+    #   - _mask: this is a numpy array of the bitboard of every slot that has a piece in it on
+    #     each board.
+    #   - _heights: this is a numpy array that maps each board and column to the bit index of the
+    #     slot a piece placed in that column will land in.
+    #   - _is_red_active: this is True when it is red's turn on the boards that are not finished.
+    n: int
+    move_number: int
+    finished: np.ndarray
+    winners: np.ndarray
+    _position: np.ndarray
+    _mask: np.ndarray
+    _heights: np.ndarray
+    _is_red_active: bool
+
+    def __init__(self, n: int, board: Optional[Board] = None) -> None:
+        """Creates a new BatchBoard of n boards. Every board starts in the same state as 'board',
+        or empty if board is None.
+
+        Preconditions:
+            - n >= 1
+        """
+        if board is None:
+            board = Board(incremental_eval=False)
+
+        self.n = n
+        self.move_number = board.move_number
+        self._is_red_active = board.get_active_player() == 1
+        self._position = np.full(n, board._position, dtype=np.uint64)
+        self._mask = np.full(n, board._mask, dtype=np.uint64)
+        self._heights = np.tile(np.array(board._heights, dtype=np.uint64), (n, 1))
+        self.finished = np.full(n, board.get_winner() is not None)
+        self.winners = np.full(n, board.get_winner() or 0, dtype=np.int8)
+
+    def get_valid_moves(self) -> np.ndarray:
+        """Return a numpy array of bools with a row for each board, which is True in the
+        columns that are not full. The rows of finished boards are all False.
+        """
+        return (self._heights <= _TOP_INDEX_ARRAY) & ~self.finished[:, np.newaxis]
+
+    def get_random_moves(self, rng: np.random.Generator) -> np.ndarray:
+        """Return a numpy array of a uniformly random valid move for each board that is not
+        finished, chosen using rng. The moves for finished boards are 0.
+        """
+        choices = rng.random((self.n, COLUMNS))
+        choices[~self.get_valid_moves()] = -1
+        return np.argmax(choices, axis=1)
+
+    def make_moves(self, moves: np.ndarray) -> None:
+        """Make the move moves[i] on board i, for every board that is not finished. The boards
+        that are finished are not changed, and their moves are ignored.
+
+        If any move is not valid on a board that is not finished, raise a ValueError.
+
+        Preconditions:
+            - moves.shape == (self.n,)
+            - not all(self.finished)
+        """
+        boards = np.arange(self.n)
+        active = ~self.finished
+        columns = np.clip(moves, 0, COLUMNS - 1)
+        if np.any(active & ((columns != moves) | ~self.get_valid_moves()[boards, columns])):
+            raise ValueError('A move is not valid')
+        moves = columns
+
+        index = self._heights[boards, moves]
+        bits = np.where(active, np.left_shift(np.uint64(1), index), np.uint64(0))
+        stones = self._position | bits
+        # The positions of finished boards are flipped too, so that every board agrees on whose
+        # pieces are in _position
+        self._position ^= self._mask
+        self._mask |= bits
+        self._heights[boards, moves] = np.where(active, index + np.uint64(1), index)
+
+        # The same check as Board._check_winner, done for every board at once
+        won = np.zeros(self.n, dtype=bool)
+        for direction in _DIRECTIONS:
+            direction = np.uint64(direction)
+            pairs = stones & (stones >> direction)
+            won |= (pairs & (pairs >> (direction + direction))) != 0
+        won &= active
+
+        self.winners[won] = 1 if self._is_red_active else -1
+        self.finished |= won | (self._mask == _BOARD_MASK)
+        self._is_red_active = not self._is_red_active
+        self.move_number += 1
+
+    def play_random_games(self, rng: np.random.Generator) -> np.ndarray:
+        """Make random moves chosen with rng on every board until all of them are finished,
+        and return self.winners.
+        """
+        while not np.all(self.finished):
+            self.make_moves(self.get_random_moves(rng))
+        return self.winners
+
+    def get_board_arrays(self) -> np.ndarray:
+        """Return a numpy array of every board in the same format as Board.board_array, with
+        shape (self.n, ROWS, COLUMNS).
+        """
+        if self._is_red_active:
+            red_stones = self._position
+        else:
+            red_stones = self._position ^ self._mask
+
+        red = (red_stones[:, np.newaxis, np.newaxis] >> _SLOT_INDEX_ARRAY) & np.uint64(1)
+        filled = (self._mask[:, np.newaxis, np.newaxis] >> _SLOT_INDEX_ARRAY) & np.uint64(1)
+        return (2 * red.astype(np.int8) - 1) * filled.astype(np.int8)
+
+
+def _add_to_windows(index: int, window_counts: list[int], lines: list[int]) -> None:
+    """Update window_counts and lines for a piece being placed in the slot with bit index 'index'.
+    Only the windows that contain the slot can change, and there are at most 13 of them.
+
+    Preconditions:
+        - window_counts and lines are the counts for the colour of the piece being placed
+    """
+    for window in _SLOT_WINDOWS[index]:
+        count = window_counts[window] + 1
+        window_counts[window] = count
+        if count == 2:
+            lines[1] += 1
+        elif count == 3:
+            lines[1] -= 1
+            lines[0] += 1
+        elif count == 4:
+            lines[0] -= 1
+
+
+def _remove_from_windows(index: int, window_counts: list[int], lines: list[int]) -> None:
+    """Update window_counts and lines for a piece being removed from the slot with bit index
+    'index'. This undoes _add_to_windows.
+
+    Preconditions:
+        - window_counts and lines are the counts for the colour of the piece being removed
+    """
+    for window in _SLOT_WINDOWS[index]:
+        count = window_counts[window]
+        window_counts[window] = count - 1
+        if count == 2:
+            lines[1] -= 1
+        elif count == 3:
+            lines[0] -= 1
+            lines[1] += 1
+        elif count == 4:
+            lines[0] += 1
+
+
 if __name__ == '__main__':
     import doctest
     doctest.testmod()
 
     import python_ta
     python_ta.check_all(config={
-        'extra-imports': ['numpy', 'scipy.signal', 'typing', 'csv'],  # the names (strs) of imported modules
-        'allowed-io': [],
+        'extra-imports': ['numpy', 'typing', 'csv', 'os', 'random'],  # the names (strs) of imported modules
+        'allowed-io': ['_read_hash_keys'],
         # the names (strs) of functions that call print/open/input
         'max-line-length': 100,
         'disable': ['E1136']
@@ -0,0 +1,262 @@
+"""CSC111 Final Project: Exploring Using Graph Based Data Structures to Implement a Connect 4 AI
+
+Module Description
+==================
+
+This module contains a command line tool that builds opening books for AIPlayerComplex from
+scratch, and combines existing ones. Unlike opening_book_gen.save_opening_book, which saves
+whatever boards happened to be searched while the AI was playing, this finds every board that can
+be reached in a given number of moves from the start of the game and searches each of them deeply.
+
+The boards are searched by a pool of processes, and each result is written to a checkpoint file as
+soon as it is found. Building a deep book can take hours, so if the tool is stopped, running it
+again with the same arguments picks up where it left off. Once every board has been searched, the
+checkpoint file is renamed to the output file, which is in the same csv format as the files made by
+opening_book_gen.save_opening_book, with an extra column for the number of pieces on each board so
+that players can skip the deeper boards (see opening_book_gen.stream_opening_book). If the output
+file ends in '.bin', a binary opening book is written instead (see opening_book_gen.py).
+
+For example, this builds a book of every board up to 8 moves in, each searched to a depth of 12:
+
+    python book_generator.py generate --plies 8 --depth 12 --output opening_book_12.csv
+
+Books built separately, including ones saved from a player's transposition table, can then be
+combined into one book that can be used at any depth with opening_book_gen.merge_opening_books.
+For example, this builds a smaller book searched more deeply, and combines it with the one above:
+
+    python book_generator.py generate --plies 6 --depth 16 --output opening_book_16.csv
+    python book_generator.py merge opening_book.bin opening_book_12.csv opening_book_16.csv
+
+The books in data/opening_books were saved before the hashes and evaluations were changed, so
+they do not match any boards, and should not be combined with books made by this tool.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) 2021 Brian Cho and Luke Avveduto
+"""
+from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import csv
+import math
+import os
+import time
+from board import Board
+from players import AIPlayerComplex
+import opening_book_gen
+from transposition_table import FLAG_NAMES, EXACT
+
+# The number of boards each process is sent at a time
+_CHUNK_SIZE = 16
+
+
+def find_positions(plies: int, canonical_hash: bool = False) -> dict[int, str]:
+    """Return a dict that maps the hash of every board that can be reached in at most 'plies'
+    moves from the start of the game, and has not been won or filled, to a string of the moves
+    that reach it. For example, '334' is the board after moves in columns 3, 3 and 4.
+
+    Boards that can be reached by more than one order of moves are only included once. If
+    canonical_hash is True, the boards are keyed by their canonical hash, so a board and its
+    mirror image are also only included once.
+
+    >>> len(find_positions(2))
+    57
+    >>> len(find_positions(2, canonical_hash=True))
+    30
+
+    Preconditions:
+        - 0 <= plies <= 42
+    """
+    positions = {}
+    _find_positions(Board(incremental_eval=False), '', plies, canonical_hash, positions)
+    return positions
+
+
+def _find_positions(board: Board, moves: str, plies: int, canonical_hash: bool,
+                    positions: dict[int, str]) -> None:
+    """Add every board that can be reached from 'board' in at most 'plies' more moves to
+    positions, as described in find_positions. 'moves' is the string of moves that reached board.
+    Boards that are already in positions are not searched again, as everything reachable from
+    them has already been added.
+
+    board is left in the same state it was in when this function was called.
+    """
+    if canonical_hash:
+        key = board.get_canonical_hash()[0]
+    else:
+        key = board.hash
+    if key in positions:
+        return
+    positions[key] = moves
+
+    if plies == 0:
+        return
+    for move in board.get_valid_moves():
+        board.make_move(move)
+        if board.get_winner() is None:
+            _find_positions(board, moves + str(move), plies - 1, canonical_hash, positions)
+        board.un_move(move)
+
+
+def generate_opening_book(plies: int, depth: int, output: str, workers: Optional[int] = None,
+                          canonical_hash: bool = False, table_size_mb: float = 16) -> None:
+    """Build an opening book of every board that can be reached in at most 'plies' moves, each
+    searched by AIPlayerComplex.minimax to a depth of 'depth', and save it to 'output'.
+
+    Results are appended to the checkpoint file output + f'.d{depth}.partial' as they are found.
+    If it already exists, the boards in it are not searched again. Each depth has its own
+    checkpoint file, so running the tool with a different depth and the same output does not
+    throw away the boards searched at the first depth. Once every board has been searched, the
+    book is saved to 'output'. This is a csv file unless 'output' ends in '.bin'.
+
+    The book only works with AIPlayerComplex players with the same value of canonical_hash.
+
+    Preconditions:
+        - 0 <= plies <= 42
+        - 1 <= depth < 128
+        - workers is None or workers >= 1
+        - table_size_mb >= 1
+    """
+    checkpoint = output + f'.d{depth}.partial'
+    done = _read_checkpoint(checkpoint, depth)
+
+    positions = find_positions(plies, canonical_hash)
+    remaining = [moves for key, moves in positions.items() if key not in done]
+    print(f'{len(positions)} boards, {len(positions) - len(remaining)} already searched')
+
+    start = time.perf_counter()
+    pool = ProcessPoolExecutor(workers)
+    try:
+        with open(checkpoint, 'a', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            results = pool.map(_search_position, remaining, [depth] * len(remaining),
+                               [canonical_hash] * len(remaining), [table_size_mb] * len(remaining),
+                               chunksize=_CHUNK_SIZE)
+            for count, (moves, (key, value)) in enumerate(zip(remaining, results), 1):
+                writer.writerow([key, value, FLAG_NAMES[EXACT], depth, len(moves)])
+                csv_file.flush()
+                if count % 1000 == 0 or count == len(remaining):
+                    rate = count / (time.perf_counter() - start)
+                    print(f'{count}/{len(remaining)} boards searched ({rate:.1f} per second)')
+    finally:
+        # If the tool is stopped, the boards that have not been searched yet are abandoned
+        # instead of waiting for them, as they will be searched when it is run again
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    if output.endswith('.bin'):
+        opening_book_gen.write_binary_opening_book(output,
+                                                   opening_book_gen.load_opening_book(checkpoint))
+        os.remove(checkpoint)
+    else:
+        os.replace(checkpoint, output)
+    print(f'Saved the opening book to {output}')
+
+
+def _read_checkpoint(checkpoint: str, depth: int) -> set[int]:
+    """Return the set of hashes in the checkpoint file 'checkpoint' that were searched to a depth
+    of 'depth', or an empty set if it does not exist.
+
+    If the tool was stopped while a row was being written, the last row may be incomplete, in
+    which case the file does not end with a newline. The file is rewritten with only the complete
+    rows for 'depth', so that new rows are not appended to the end of an incomplete one.
+    """
+    if not os.path.exists(checkpoint):
+        return set()
+
+    with open(checkpoint, newline='') as csv_file:
+        lines = csv_file.read().splitlines(keepends=True)
+    if lines and not lines[-1].endswith('\n'):
+        lines.pop()
+
+    rows = [row for row in csv.reader(lines)
+            if len(row) in {4, 5} and row[2] == FLAG_NAMES[EXACT] and row[3] == str(depth)]
+
+    with open(checkpoint + '.tmp', 'w', newline='') as csv_file:
+        csv.writer(csv_file).writerows(rows)
+    os.replace(checkpoint + '.tmp', checkpoint)
+    return {int(row[0]) for row in rows}
+
+
+def _search_position(moves: str, depth: int, canonical_hash: bool,
+                     table_size_mb: float) -> tuple[int, int]:
+    """Return the key the board reached by the string of moves 'moves' is stored under in the
+    opening book, and its evaluation by AIPlayerComplex.minimax with a depth of 'depth'. The key
+    is the board's canonical hash if canonical_hash is True, and its hash otherwise.
+
+    Every board is searched with a new transposition table. The evaluations minimax finds for a
+    board depend on how many moves are left to search from it, so entries left over from
+    searching a board with a different number of moves on it could change the result. This way,
+    the book is the same no matter what order the boards are searched in, or whether the tool
+    was stopped part way through.
+    """
+    board = Board()
+    for move in moves:
+        board.make_move(int(move))
+
+    player = AIPlayerComplex(depth=0, table_size_mb=table_size_mb, endgame_threshold=0,
+                             canonical_hash=canonical_hash)
+    _, value = player.minimax(board, -math.inf, math.inf, depth, board.get_active_player())
+    if canonical_hash:
+        return board.get_canonical_hash()[0], value
+    return board.hash, value
+
+
+def main(args: Optional[list[str]] = None) -> None:
+    """Run the opening book tool with the command line arguments 'args', or the ones the
+    program was run with if args is None. Run with --help for a description of them.
+    """
+    parser = argparse.ArgumentParser(description='Build and combine opening books for '
+                                                 'AIPlayerComplex.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help='build a new opening book')
+    generate.add_argument('--plies', type=int, required=True,
+                          help='include boards up to this many moves from the start')
+    generate.add_argument('--depth', type=int, required=True,
+                          help='the depth to search each board to')
+    generate.add_argument('--output', required=True,
+                          help='the file to save the book to, a binary book if it ends in .bin')
+    generate.add_argument('--workers', type=int, default=None,
+                          help='the number of processes to search with (default: one per core)')
+    generate.add_argument('--canonical', action='store_true',
+                          help='key boards by their canonical hash, for canonical_hash=True '
+                               'players')
+    generate.add_argument('--table-size-mb', type=float, default=16,
+                          help='the size of the transposition table used for each board')
+
+    merge = commands.add_parser('merge', help='combine opening books into one')
+    merge.add_argument('output', help='the file to save the combined book to, a binary book if '
+                                      'it ends in .bin')
+    merge.add_argument('books', nargs='+', help='the csv or binary books to combine')
+
+    arguments = parser.parse_args(args)
+    if arguments.command == 'generate':
+        generate_opening_book(arguments.plies, arguments.depth, arguments.output,
+                              arguments.workers, arguments.canonical, arguments.table_size_mb)
+    else:
+        opening_book_gen.merge_opening_book_files(arguments.output, arguments.books)
+        print(f'Saved the combined opening book to {arguments.output}')
+
+
+if __name__ == '__main__':
+    import sys
+    # The doctests and python_ta are only run with --self-check, and any other arguments are
+    # passed to main, so that running the tool with no arguments still runs the tool
+    if sys.argv[1:] == ['--self-check']:
+        import doctest
+        doctest.testmod()
+
+        import python_ta
+        python_ta.check_all(config={
+            'extra-imports': ['typing', 'concurrent.futures', 'argparse', 'csv', 'math', 'os',
+                              'time', 'board', 'players', 'opening_book_gen',
+                              'transposition_table'],
+            # the names (strs) of imported modules
+            'allowed-io': ['generate_opening_book', '_read_checkpoint', 'main'],
+            # the names (strs) of functions that call print/open/input
+            'max-line-length': 100,
+            'disable': ['E1136']
+        })
+    else:
+        main()
@@ -17,16 +17,19 @@ from visualization import run_game_visualized
 from visualization import run_games
 
 
-def play_with_ai(depth: int = 6) -> None:
+def play_with_ai(depth: int = 6, ponder: bool = False) -> None:
     """A function that runs a visualized game of Connect4 between AIPlayerComplex and HumanPlayer.
 
     depth is the number of moves the AI will look ahead to calculate the best move to be made.
     Higher depth will result in a smarter AI that makes better moves and is harder to beat.
     But, if depth is too high, the AI will take too long to play the move. The function defaults
-    the depth to 6, and that is recommended. depth of 7 is also playable, but note that
-    the AI will take approximately 40s per move, especially in the beginning stages of the game.
+    the depth to 6, and that is recommended. Depths of 7 and 8 are also playable: on the boards
+    benchmark.py searches, the AI takes about 0.04s per move at depth 7 and about 0.1s per move at
+    depth 8, and about 0.06s for its first move at depth 7.
+    If ponder is True, the AI ponders while the human is choosing their move, so when the human
+    takes a while, or makes the move the AI expected, the AI often replies straight away.
     """
-    red = AIPlayerComplex(depth=depth)
+    red = AIPlayerComplex(depth=depth, ponder=ponder)
     yellow = HumanPlayer()
 
     run_game_visualized(red, yellow)
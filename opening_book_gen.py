@@ -15,13 +15,46 @@ The keys used in for the Zobrist hashing can be found in:
 data/Zobrist_Hash_keys/Zobrist_red_keys.csv
 data/Zobrist_Hash_keys/Zobrist_yellow_keys.csv
 
+Opening books can be saved as csv files, which are easy to read and edit, or in a binary format.
+Loading a csv file means parsing every row of it into a dict, which takes a noticeable amount of
+time for large books and uses memory in every process that loads it. A binary book is instead
+memory-mapped by BinaryOpeningBook and searched directly, so nothing needs to be loaded, and every
+process using the same book shares one copy of it. The binary format is:
+    - an 8 byte header, _BOOK_MAGIC, followed by the number of entries as an 8 byte int
+    - the hash of every entry, as 8 byte ints sorted from smallest to largest
+    - the value of every entry, as 4 byte ints, in the same order as the hashes
+    - the flag of every entry, as 1 byte ints, using the flags from transposition_table.py
+    - the depth of every entry, as 1 byte ints
+All of the ints are stored little-endian. convert_opening_book converts a csv book into a binary
+one.
+
+A csv book can also be read a chunk at a time with stream_opening_book, so that a player can
+start using the first part of a large book straight away. Rows of a csv book may have a fifth
+column, the number of pieces on the board, which lets the entries for boards more than a given
+number of moves into the game be skipped.
+
+Books made by different runs (for example, by book_generator.py on different machines, or saved
+from the transposition tables of different players) can be combined with merge_opening_books,
+which keeps the single most useful entry for each board.
+
 Copyright and Usage Information
 ===============================
 
 This file is Copyright (c) 2021 Brian Cho and Luke Avveduto
 """
+from typing import Iterator, Optional
+from array import array
+from bisect import bisect_left
 import csv
 import math
+import mmap
+import struct
+import sys
+from transposition_table import FLAGS, FLAG_NAMES, EXACT
+
+# The first 8 bytes of every binary opening book, and the layout of the header they start
+_BOOK_MAGIC = b'C4BOOK01'
+_BOOK_HEADER = struct.Struct('<8sQ')
 
 
 def save_opening_book(output: str, table: dict[int: (int, 'str', int)],
@@ -32,9 +65,24 @@ def save_opening_book(output: str, table: dict[int: (int, 'str', int)],
 
     Preconditions:
         - original_depth >= 0
-        - table must be a transposition table produced by AIPlayerComplex
+        - table must be produced by TranspositionTable.to_opening_book, for example from the
+          transposition table of an AIPlayerComplex
+    """
+    write_opening_book(output + '_' + str(original_depth) + '.csv', table)
+
+
+def write_opening_book(file: str, table: dict[int: (int, 'str', int)]) -> None:
+    """Saves the entries of table into 'file'. This is a binary opening book if file ends in
+    '.bin', and a csv file in the format used by save_opening_book otherwise.
+
+    Preconditions:
+        - table must be produced by TranspositionTable.to_opening_book or load_opening_book
     """
-    with open(output + '_' + str(original_depth) + '.csv', 'w', newline='') as csv_file:
+    if file.endswith('.bin'):
+        write_binary_opening_book(file, table)
+        return
+
+    with open(file, 'w', newline='') as csv_file:
         writer = csv.writer(csv_file)
 
         for board in table:
@@ -43,23 +91,234 @@ def save_opening_book(output: str, table: dict[int: (int, 'str', int)],
         csv_file.close()
 
 
-def load_opening_book(file: str) -> {int: (int, str)}:
+def load_opening_book(file: str, max_plies: Optional[int] = None) -> {int: (int, str)}:
     """Returns a dictionary (transposition table) that maps board hashes to their evaluation.
+    If 'file' ends in '.bin', it is read as a binary opening book.
+
+    If max_plies is given, the rows of a csv book for boards with more than max_plies pieces on
+    them are skipped. See stream_opening_book.
+
     Preconditions:
-        - 'file' must be a path to a file created by 'save_opening_book'
+        - 'file' must be a path to a file created by 'save_opening_book' or
+          'write_binary_opening_book'
     """
+    if file.endswith('.bin'):
+        return {key: (value, FLAG_NAMES[flag], depth)
+                for key, (value, flag, depth, _) in BinaryOpeningBook(file).items()}
+
     opening_book = {}
+    for chunk in stream_opening_book(file, max_plies=max_plies):
+        opening_book.update(chunk)
+    return opening_book
+
+
+def stream_opening_book(file: str, chunk_size: int = 4096,
+                        max_plies: Optional[int] = None) -> Iterator[dict[int: (int, str, int)]]:
+    """Return an iterator over the entries of the csv opening book 'file', in dicts of at most
+    chunk_size entries in the same format as load_opening_book. The file is only read as each
+    chunk is asked for, so the first chunks can be used before the rest of the file is read.
+
+    If max_plies is given, rows that have a fifth column with the number of pieces on the board
+    are skipped if that is more than max_plies. Rows without one are always kept, as it is not
+    known how far into the game their boards are.
+
+    Preconditions:
+        - 'file' must be a path to a csv file created by 'save_opening_book'
+        - chunk_size >= 1
+    """
     with open(file) as csv_file:
-        reader = csv.reader(csv_file)
-        for row in reader:
+        chunk = {}
+        for row in csv.reader(csv_file):
+            if max_plies is not None and len(row) > 4 and int(row[4]) > max_plies:
+                continue
+
             if row[1] == 'inf':
                 value = math.inf
             elif row[1] == '-inf':
                 value = -math.inf
             else:
                 value = int(row[1])
-            opening_book[int(row[0])] = (value, row[2], int(row[3]))
-    return opening_book
+            chunk[int(row[0])] = (value, row[2], int(row[3]))
+
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = {}
+
+        if chunk:
+            yield chunk
+
+
+def save_binary_opening_book(output: str, table: dict[int: (int, 'str', int)],
+                             original_depth: int) -> None:
+    """Saves a transposition table into a binary opening book to be read from later with a
+    BinaryOpeningBook. Like save_opening_book, the file is named by adding
+    '_' + str(original_depth) + '.bin' to the end of output.
+
+    Entries with an infinite value do not say anything about the board, so they are not saved.
+
+    Preconditions:
+        - original_depth >= 0
+        - table must be produced by TranspositionTable.to_opening_book or load_opening_book
+    """
+    write_binary_opening_book(output + '_' + str(original_depth) + '.bin', table)
+
+
+def convert_opening_book(csv_file: str, binary_file: str) -> None:
+    """Converts the csv opening book csv_file into a binary opening book saved as binary_file.
+
+    Preconditions:
+        - 'csv_file' must be a path to a file created by 'save_opening_book'
+    """
+    write_binary_opening_book(binary_file, load_opening_book(csv_file))
+
+
+def write_binary_opening_book(file: str, table: dict[int: (int, 'str', int)]) -> None:
+    """Saves the entries of table into the binary opening book 'file'. See the module description
+    for the format it is saved in. Entries with an infinite value are not saved.
+
+    Preconditions:
+        - table must be produced by TranspositionTable.to_opening_book or load_opening_book
+    """
+    keys = sorted(key for key in table if not math.isinf(table[key][0]))
+    values = array('i', [table[key][0] for key in keys])
+    flags = array('B', [FLAGS[table[key][1]] for key in keys])
+    depths = array('B', [table[key][2] for key in keys])
+    keys = array('Q', keys)
+
+    with open(file, 'wb') as binary_file:
+        binary_file.write(_BOOK_HEADER.pack(_BOOK_MAGIC, len(keys)))
+        for section in (keys, values, flags, depths):
+            if section.itemsize > 1 and sys.byteorder == 'big':
+                section.byteswap()
+            section.tofile(binary_file)
+
+
+def merge_opening_books(books: list[dict[int: (int, 'str', int)]]) -> dict[int: (int, 'str', int)]:
+    """Return a single opening book with the entries of every book in 'books'. When more than one
+    book has an entry for the same board, only the most useful one is kept:
+        - the entry searched to the greatest depth, as it can be used by searches of any depth
+          up to it
+        - out of entries with the same depth, an exact value instead of a bound
+        - out of bounds of the same kind and depth, the one closest to the real value: the
+          highest lower bound or the lowest upper bound
+    Entries with an infinite value do not say anything about the board, so they are dropped.
+
+    >>> merge_opening_books([{1: (5, 'low', 3), 2: (4, 'exact', 2)},
+    ...                      {1: (7, 'exact', 3), 2: (9, 'high', 4), 3: (math.inf, 'low', 1)}])
+    {1: (7, 'exact', 3), 2: (9, 'high', 4)}
+
+    Preconditions:
+        - every book in books is produced by TranspositionTable.to_opening_book or
+          load_opening_book
+    """
+    merged = {}
+    for book in books:
+        for key, entry in book.items():
+            if math.isinf(entry[0]):
+                continue
+            if key not in merged or _is_better_entry(entry, merged[key]):
+                merged[key] = entry
+    return merged
+
+
+def merge_opening_book_files(output: str, files: list[str]) -> None:
+    """Combine the opening books 'files' with merge_opening_books, and save the result to
+    'output'. Each of the files, and output, can be either a csv or a binary opening book.
+
+    Preconditions:
+        - every file in files was created by 'save_opening_book' or 'write_binary_opening_book'
+    """
+    write_opening_book(output, merge_opening_books([load_opening_book(file) for file in files]))
+
+
+def _is_better_entry(entry: (int, str, int), current: (int, str, int)) -> bool:
+    """Return whether 'entry' should replace 'current' as the entry for a board when merging
+    opening books. See merge_opening_books.
+    """
+    value, flag, depth = entry
+    current_value, current_flag, current_depth = current
+    if depth != current_depth:
+        return depth > current_depth
+    if flag != current_flag:
+        return flag == FLAG_NAMES[EXACT]
+    if flag == 'low':
+        return value > current_value
+    if flag == 'high':
+        return value < current_value
+    return False
+
+
+class BinaryOpeningBook:
+    """An opening book stored in a binary file, which is read straight from the file whenever an
+    entry is looked up. The file is memory-mapped, so the operating system only reads the parts
+    of it that are used, and processes that open the same book share the same memory.
+
+    Entries are looked up with a binary search on the sorted hashes, so it takes about 17 steps
+    to look up an entry in a book with 100 000 entries.
+
+    Representation Invariants:
+        - len(self._keys) == len(self._values) == len(self._flags) == len(self._depths)
+        - all(self._keys[i] < self._keys[i + 1] for i in range(len(self._keys) - 1))
+    """
+    # Public Instance Attributes:
+    #   - file: this is the path to the binary file the book is stored in.
+    #
+    # Private Instance Attributes:
+    #   - _keys: this is a view into the file of the hash of every entry, sorted.
+    #   - _values: this is a view into the file of the value of each entry in _keys.
+    #   - _flags: this is a view into the file of the flag of each entry in _keys.
+    #   - _depths: this is a view into the file of the depth of each entry in _keys.
+    file: str
+    _keys: memoryview
+    _values: memoryview
+    _flags: memoryview
+    _depths: memoryview
+
+    def __init__(self, file: str) -> None:
+        """Opens the binary opening book 'file'. Raises a ValueError if it is not one.
+
+        Preconditions:
+            - the machine this is run on is little-endian
+        """
+        self.file = file
+        with open(file, 'rb') as binary_file:
+            memory = mmap.mmap(binary_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(memory) < _BOOK_HEADER.size:
+            raise ValueError(f'"{file}" is not a binary opening book')
+        magic, count = _BOOK_HEADER.unpack_from(memory)
+        if magic != _BOOK_MAGIC or len(memory) != _BOOK_HEADER.size + 14 * count:
+            raise ValueError(f'"{file}" is not a binary opening book')
+
+        view = memoryview(memory)
+        start = _BOOK_HEADER.size
+        self._keys = view[start:start + 8 * count].cast('Q')
+        start += 8 * count
+        self._values = view[start:start + 4 * count].cast('i')
+        start += 4 * count
+        self._flags = view[start:start + count]
+        self._depths = view[start + count:start + 2 * count]
+
+    def __len__(self) -> int:
+        """Return the number of entries in the book."""
+        return len(self._keys)
+
+    def probe(self, key: int) -> Optional[tuple[int, int, int, None]]:
+        """Return a tuple of the value, flag, depth and best move stored for the board with hash
+        'key', in the same format as TranspositionTable.probe, or None if the board is not in the
+        book. Opening books do not store best moves, so the best move is always None.
+        """
+        index = bisect_left(self._keys, key)
+        if index < len(self._keys) and self._keys[index] == key:
+            return self._values[index], self._flags[index], self._depths[index], None
+        return None
+
+    def items(self) -> Iterator[tuple[int, tuple[int, int, int, None]]]:
+        """Return an iterator over the hash and (value, flag, depth, best move) tuple of every
+        entry in the book, in order of their hashes.
+        """
+        for i in range(len(self._keys)):
+            yield self._keys[i], (self._values[i], self._flags[i], self._depths[i], None)
 
 
 if __name__ == '__main__':
@@ -68,8 +327,10 @@ if __name__ == '__main__':
 
     import python_ta
     python_ta.check_all(config={
-        'extra-imports': ['csv', 'math'],  # the names (strs) of imported modules
-        'allowed-io': ['load_opening_book', 'save_opening_book'],  # the names (strs) of functions that call print/open/input
+        'extra-imports': ['csv', 'math', 'typing', 'array', 'bisect', 'mmap', 'struct',
+                          'sys', 'transposition_table'],  # the names (strs) of imported modules
+        'allowed-io': ['write_opening_book', 'stream_opening_book', 'write_binary_opening_book',
+                       'BinaryOpeningBook.__init__'],  # the names (strs) of functions that call print/open/input
         'max-line-length': 100,
         'disable': ['E1136']
     })
@@ -0,0 +1,204 @@
+"""CSC111 Final Project: Exploring Using Graph Based Data Structures to Implement a Connect 4 AI
+
+Module Description
+==================
+
+This module contains a 'perft' (performance test) tool, which checks that a board makes and
+undoes moves correctly and measures how fast it does so. It counts every board that can be
+reached in exactly a given number of moves from a starting board, by making and undoing every
+possible move. Games stop once someone wins, so no moves are made on a board that has been won.
+From the empty board, the counts are:
+
+    depth   1   2   3     4      5       6       7        8
+    count   7  49  343  2401  16807  117649  823536  5673234
+
+No one can win in fewer than 7 moves, so the first six counts are powers of 7, and the count for
+7 moves is 7 ** 7 - 7, as the 7 ways of filling a column with the first 6 moves leave only 6
+moves for the 7th. The count for 8 moves also leaves out the games won on the 7th move. These
+counts were checked with --check, and against a separate brute force count on plain lists of
+columns that does not use Board. A board that gets any of them wrong is making or undoing moves
+incorrectly.
+
+With checking turned on, every board reached is also compared to a Board built from scratch
+from the same pieces: its hash, mirror hash and evaluation must all be the same as the ones kept
+up to date as moves are made, and undoing a move must give back exactly the board from before
+the move was made. This catches mistakes like undoing a yellow piece with red's Zobrist key,
+which silently corrupts the hash and so poisons every transposition table the board is used with.
+
+For example, this counts the boards 8 moves in from the board after moves in columns 3 and 3,
+and checks every one of them:
+
+    python perft.py --depth 8 --moves 33 --check
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) 2021 Brian Cho and Luke Avveduto
+"""
+from typing import Optional
+import argparse
+import time
+from board import Board
+
+
+class BoardIntegrityError(Exception):
+    """Raised by perft when a board's incrementally updated state does not match the state it
+    should have.
+    """
+
+
+def perft(board: Board, depth: int, check: bool = False) -> int:
+    """Return the number of boards that can be reached by making exactly 'depth' moves on
+    'board', where no moves are made after a game has been won.
+
+    If check is True, every board reached is checked as described in the module description, and
+    BoardIntegrityError is raised if any of them are wrong.
+
+    board is left in the same state it was in when this function was called.
+
+    >>> perft(Board(), 4)
+    2401
+    >>> perft(Board(), 3, check=True)
+    343
+
+    Preconditions:
+        - depth >= 0
+    """
+    if check:
+        _check_board(board, [])
+    return _perft(board, depth, check, [])
+
+
+def divide(board: Board, depth: int, check: bool = False) -> dict[int, int]:
+    """Return a dict that maps each valid move on 'board' to the number of boards perft counts
+    after making that move, with a depth of depth - 1. When two boards give different perft
+    counts, this shows which move the difference is under.
+
+    Preconditions:
+        - depth >= 1
+        - board.get_winner() is None
+    """
+    counts = {}
+    for move in board.get_valid_moves():
+        board.make_move(move)
+        if check:
+            _check_board(board, [move])
+        counts[move] = _perft(board, depth - 1, check, [move])
+        board.un_move(move)
+    return counts
+
+
+def _perft(board: Board, depth: int, check: bool, moves: list[int]) -> int:
+    """Return the number of boards counted by perft, where 'moves' is the list of moves that
+    were made to reach board from the board perft started from.
+    """
+    if depth == 0:
+        return 1
+    if board.get_winner() is not None:
+        return 0
+    if depth == 1 and not check:
+        # Every move reaches a new board, so there is no need to make them
+        return len(board.get_valid_moves())
+
+    count = 0
+    for move in list(board.get_valid_moves()):
+        if check:
+            before = _snapshot(board)
+        board.make_move(move)
+        moves.append(move)
+        if check:
+            _check_board(board, moves)
+
+        count += _perft(board, depth - 1, check, moves)
+
+        board.un_move(move)
+        moves.pop()
+        if check:
+            after = _snapshot(board)
+            for name in before:
+                if after[name] != before[name]:
+                    raise BoardIntegrityError(f'Undoing move {move} after moves {moves} changed '
+                                              f'the {name} from {before[name]} to {after[name]}')
+    return count
+
+
+def _snapshot(board: Board) -> dict[str, object]:
+    """Return a dict of everything about 'board' that should be the same after a move is made
+    and then undone.
+    """
+    return {'hash': board.hash, 'mirror hash': board.mirror_hash,
+            'move number': board.move_number, 'active player': board.get_active_player(),
+            'winner': board.get_winner(), 'valid moves': list(board.get_valid_moves()),
+            'pieces': board.board_array.tolist()}
+
+
+def _check_board(board: Board, moves: list[int]) -> None:
+    """Raise BoardIntegrityError if the hash, mirror hash or evaluation of 'board' do not match
+    those of a new Board built from its pieces. 'moves' is the list of moves that reached it.
+    """
+    fresh = Board(board.board_array.tolist(), board.get_active_player() == 1,
+                  incremental_eval=False)
+    for name, actual, expected in (('hash', board.hash, fresh.hash),
+                                   ('mirror hash', board.mirror_hash, fresh.mirror_hash),
+                                   ('evaluation', board.evaluate_score(1),
+                                    fresh.evaluate_score(1))):
+        if actual != expected:
+            raise BoardIntegrityError(f'After moves {moves}, the {name} is {actual} instead of '
+                                      f'{expected}')
+
+
+def main(args: Optional[list[str]] = None) -> None:
+    """Run perft with the command line arguments 'args', or the ones the program was run with if
+    args is None. Run with --help for a description of them.
+    """
+    parser = argparse.ArgumentParser(description='Count the boards reachable in a number of '
+                                                 'moves, to test and time Board.')
+    parser.add_argument('--depth', type=int, required=True, help='the number of moves to make')
+    parser.add_argument('--moves', default='',
+                        help='the columns of the moves that reach the starting board, for '
+                             'example 334 (default: the empty board)')
+    parser.add_argument('--check', action='store_true',
+                        help='check the hash, mirror hash and evaluation of every board')
+    parser.add_argument('--divide', action='store_true',
+                        help='print the count under each move of the starting board')
+    parser.add_argument('--no-incremental-eval', action='store_true',
+                        help='use boards that do not keep their evaluation up to date')
+
+    arguments = parser.parse_args(args)
+    board = Board(incremental_eval=not arguments.no_incremental_eval)
+    for move in arguments.moves:
+        board.make_move(int(move))
+
+    start = time.perf_counter()
+    if arguments.divide:
+        counts = divide(board, arguments.depth, arguments.check)
+        for move in sorted(counts):
+            print(f'{move}: {counts[move]}')
+        nodes = sum(counts.values())
+    else:
+        nodes = perft(board, arguments.depth, arguments.check)
+    elapsed = time.perf_counter() - start
+
+    print(f'Nodes: {nodes}')
+    print(f'Time: {elapsed:.2f} seconds ({nodes / max(elapsed, 1e-9):.0f} nodes per second)')
+
+
+if __name__ == '__main__':
+    import sys
+    # The doctests and python_ta are only run with --self-check, and any other arguments are
+    # passed to main, so that running the tool with no arguments still runs the tool
+    if sys.argv[1:] == ['--self-check']:
+        import doctest
+        doctest.testmod()
+
+        import python_ta
+        python_ta.check_all(config={
+            'extra-imports': ['typing', 'argparse', 'time', 'board'],
+            # the names (strs) of imported modules
+            'allowed-io': ['main'],
+            # the names (strs) of functions that call print/open/input
+            'max-line-length': 100,
+            'disable': ['E1136']
+        })
+    else:
+        main()
@@ -3,8 +3,8 @@
 Module Description
 ==================
 
-This module contains the Player abstract class and three implementations of it:
-HumanPlayer, RandomPlayer, and AIPlayerComplex. The Player class is designed to
+This module contains the Player abstract class and four implementations of it:
+HumanPlayer, RandomPlayer, AIPlayerComplex, and AIPlayerNegamax. The Player class is designed to
 represent a player in a game of connect 4. This means they are given the state of the board in the
 form of a Board object, and then must decide on a move to play. All of the provided implementations
 do that, but how they achieve that varies massively.
@@ -14,11 +14,35 @@ Copyright and Usage Information
 
 This file is Copyright (c) 2021 Brian Cho and Luke Avveduto
 """
-from typing import Optional
+from typing import Iterator, Optional
+from concurrent.futures import ProcessPoolExecutor
+from array import array
 import random
 import math
-from board import Board
+import threading
+import time
+import weakref
+from board import Board, ROWS, COLUMNS
 import opening_book_gen
+from transposition_table import TranspositionTable, EXACT, LOWER, UPPER
+from solver import EndgameSolver
+from search_stats import SearchStats
+
+# The evaluation of a board where the player whose turn it is can win on their next move, a value
+# larger than any evaluation a board can have, and how far on either side of the previous
+# evaluation the aspiration windows used by AIPlayerNegamax start.
+_WIN_SCORE = 1000000
+_INFINITY = 10 * _WIN_SCORE
+_ASPIRATION_WINDOW = 50
+
+# The longest time, in seconds, that AIPlayerComplex spends loading its csv opening book before
+# each move. Large books are loaded a piece at a time over several moves, so the player does not
+# have to wait for the whole book to be read before it can start playing.
+_BOOK_LOAD_SECONDS = 0.05
+
+# In each process of the pool used by an AIPlayerComplex with more than one worker, this is the
+# player that does that process's share of the search. It is None in every other process.
+_search_worker = None
 
 
 class Player:
@@ -33,6 +57,18 @@ class Player:
         """Make a move in the current game"""
         raise NotImplementedError
 
+    def stop(self) -> None:
+        """Stop the move this player is choosing in another thread as soon as possible. Players
+        that can not be stopped ignore this, and keep choosing their move as normal.
+        """
+
+    def get_progress(self) -> Optional[tuple[int, int]]:
+        """Return a tuple of the depth this player is searching to and the number of boards it
+        has searched so far, while it is choosing a move in another thread. Returns None if it is
+        not searching, or does not keep track of its progress.
+        """
+        return None
+
 
 class HumanPlayer(Player):
     """A Connect 4 player that requires an input"""
@@ -88,230 +124,1291 @@ class AIPlayerComplex(Player):
 
     Representation Invariants:
         - self._depth >= 0
-        - all({self._transposition_table[1] in {'exact', 'high', 'low'} for key in self._transposition_table})
-        - all({self._depth >= self._transposition_table[2] >= 0 for key in self._transposition_table})
+        - self._endgame_threshold == 0 or self._endgame_solver is not None
     """
+    # Public Instance Attributes:
+    #   - last_stats: this is the SearchStats of the last move this AI made, or None if it is
+    #            not collecting stats or has not made a move yet.
+    #
     # Private Instance Attributes:
-    #   - _transposition_table: This is a dict that maps boards to their evaluation by the minimax
+    #   - _transposition_table: This is a table that maps boards to their evaluation by the minimax
     #   algorithm. In particular, it doesn't actually map Board objects to evaluations, instead each
-    #   has a hash and that is mapped to a tuple the contains the evaluation of that board with the
-    #   by the minimax algorithm, a string that says whether the value is exact, an upperbound, or
-    #   a lower bound, and finally the depth those values were calculated at For more information on
-    #   these hashes, see opening_book_gen.py
+    #   has a hash and that is mapped to the evaluation of that board by the minimax algorithm,
+    #   a flag that says whether the value is exact, an upperbound, or a lower bound, the depth
+    #   those values were calculated at, and the best move. It has a fixed size, so it never uses
+    #   more memory than it is given. For more information on these hashes, see opening_book_gen.py
     #   - _depth: this is the depth that minimax algorithm will use. This is measure of how many
     #            moves ahead the AI will look on any given turn.
+    #   - _time_limit_ms: this is the number of milliseconds the AI is allowed to spend on each
+    #            move. If it is None, the AI always searches to a depth of _depth, no matter how
+    #            long that takes. Otherwise, _depth is the deepest the AI will search.
+    #   - _deadline: this is the time (from time.perf_counter) that the current search has to be
+    #            stopped by, or None if the current search does not have a time limit.
+    #   - _root_move_number: this is the move number of the board the current search started
+    #            from. That board is never looked up in the transposition table.
+    #   - _move_ordering: this decides what order the moves on each board are searched in, using
+    #            the best moves stored in the transposition table, killer moves, and history scores.
+    #   - _pool: this is the pool of processes the moves of the board the search starts from are
+    #            split between, or None if the search is only done in this process.
+    #   - _endgame_threshold: once there are fewer than this many empty slots on the board, the
+    #            AI stops using minimax and plays the perfect move found by _endgame_solver.
+    #   - _endgame_solver: this is the solver used to play perfectly at the end of the game, or
+    #            None if _endgame_threshold is 0.
+    #   - _opening_book: this is the binary opening book that is looked in for boards that are not
+    #            in the transposition table, or None if the AI has no binary opening book. Opening
+    #            books saved as csv files are instead loaded into the transposition table.
+    #   - _book_chunks: this is an iterator over the chunks of the csv opening book that have not
+    #            been loaded into the transposition table yet, or None if there are none left.
+    #   - _canonical_hash: this is True when boards are looked up in the transposition table and
+    #            opening book by their canonical hash (see Board.get_canonical_hash), so that a
+    #            board and its mirror image share an entry. The best moves stored in the entries
+    #            are for the board the canonical hash came from.
+    #   - _collect_stats: this is True when a SearchStats is filled in for every move.
+    #   - _stats_file: this is the file the stats of every move are added to as a line of JSON,
+    #            or None if they are not saved.
+    #   - _stats: this is the SearchStats being filled in by the current search, or None if stats
+    #            are not being collected. The search only has to check this is None when they
+    #            are not, so collecting them can be turned off without slowing the search down.
+    #   - _nodes: this is the number of boards minimax has been called on in the current search.
+    #   - _search_depth: this is the depth the current search is searching to, or None if the AI
+    #            is not searching with minimax.
+    #   - _searching: this is True while make_move is choosing a move.
+    #   - _stopped: this is True once the current search has to stop, which makes minimax raise
+    #            _SearchTimeout. This happens when stop is called, or when make_move stops the
+    #            pondering because it is searching a board the opponent did not play.
+    #   - _stop_requested: this is True once stop has been called during the current search.
+    #   - _stop_lock: this is held while _searching, _pondering, _stopped, _stop_requested,
+    #            _pondering_hash or _ponder_target are changed, so that stop can never stop a
+    #            search that starts after the one it was called during.
+    #   - _ponder: this is True when the AI ponders after each of its moves. See
+    #            self._start_pondering.
+    #   - _ponder_thread: this is the thread the AI pondered or is pondering in since its last
+    #            move, or None if it has not pondered since then.
+    #   - _pondering: this is True while _ponder_thread is running.
+    #   - _ponder_results: this maps the hash of each board that pondering finished searching to
+    #            the move found for it.
+    #   - _pondering_hash: this is the hash of the board pondering is searching, or None if it is
+    #            not searching one.
+    #   - _ponder_target: this is the hash of the board make_move was called with while the AI
+    #            was pondering, or None if it has not been called yet. Pondering stops once it
+    #            is set, after finishing its search if that search is for this board.
+    last_stats: Optional[SearchStats]
     _depth: int
-    _transposition_table: dict[int:(int, str, int)]
+    _transposition_table: TranspositionTable
+    _time_limit_ms: Optional[int]
+    _deadline: Optional[float]
+    _root_move_number: int
+    _move_ordering: '_MoveOrdering'
+    _pool: Optional[ProcessPoolExecutor]
+    _endgame_threshold: int
+    _endgame_solver: Optional[EndgameSolver]
+    _opening_book: Optional[opening_book_gen.BinaryOpeningBook]
+    _book_chunks: Optional[Iterator[dict[int, tuple[int, str, int]]]]
+    _canonical_hash: bool
+    _collect_stats: bool
+    _stats_file: Optional[str]
+    _stats: Optional[SearchStats]
+    _nodes: int
+    _search_depth: Optional[int]
+    _searching: bool
+    _stopped: bool
+    _stop_requested: bool
+    _stop_lock: threading.Lock
+    _ponder: bool
+    _ponder_thread: Optional[threading.Thread]
+    _pondering: bool
+    _ponder_results: dict[int, int]
+    _pondering_hash: Optional[int]
+    _ponder_target: Optional[int]
+
+    def __init__(self, depth: int = 6, opening_book: Optional[str] = None,
+                 time_limit_ms: Optional[int] = None, table_size_mb: float = 16,
+                 workers: int = 1, endgame_threshold: int = 20,
+                 canonical_hash: bool = False, book_plies: Optional[int] = None,
+                 collect_stats: bool = False, stats_file: Optional[str] = None,
+                 ponder: bool = False) -> None:
+        """Creates a new instance of the AIPlayerComplex class. If an opening book is given, a csv
+        opening book is loaded into it's transposition table, while a binary one (a file ending in
+        '.bin') is memory-mapped and looked in during the search. No opening book is used by
+        default.
 
-    def __init__(self, depth: int = 6, opening_book: Optional[str] = None) -> None:
-        """Creates a new instance of the AIPlayerComplex class. Reads in the values in it's opening
-        book. If an opening book is given, it will be loaded into it's transposition table.
+        A csv opening book is not all loaded straight away. Instead, a little more of it is loaded
+        before each move until all of it has been loaded, and the entries are used as soon as they
+        are loaded. If book_plies is given, the entries for boards with more than that many pieces
+        on them are skipped, as long as the book records how many pieces are on each board (see
+        opening_book_gen.stream_opening_book).
+
+        The transposition table uses at most table_size_mb megabytes of memory. Once it is full,
+        the entries that were searched the least deeply are replaced first.
+
+        If time_limit_ms is given, the AI will use iterative deepening: it searches with a depth
+        of 1, then 2, and so on up to 'depth', until time_limit_ms milliseconds have passed. The
+        move found by the deepest search that finished is played.
+
+        If workers is more than 1, the search is split between a pool of that many processes,
+        which all share the same transposition table. See self._parallel_player.
+
+        Once there are fewer than endgame_threshold empty slots left on the board, the AI finds
+        the perfect move with an EndgameSolver instead. The default of 20 keeps the time this
+        takes to well under a second. Set it to 0 to always use minimax.
+
+        If canonical_hash is True, a board and its mirror image share one entry in the
+        transposition table and opening book. Opening books are only found in by a player with
+        the same value of canonical_hash as the player whose transposition table they were saved
+        from. The opening books that come with the project do not use canonical hashes.
+
+        If collect_stats is True, the statistics of the search for each move are recorded in a
+        SearchStats, which is stored in self.last_stats once the move is chosen. If stats_file is
+        given, they are also added to the end of that file as a line of JSON. Only the boards
+        searched in this process are counted, so the boards searched by the pool when workers is
+        more than 1 are not included.
+
+        If ponder is True, the AI keeps searching in a background thread after each of its moves
+        while the opponent chooses their move (see self._start_pondering), so that it can often
+        reply straight away. The background search slows down anything else running in the same
+        process, such as the other player's search in a game between two AIs, so this is meant
+        for games against humans.
 
         Preconditions:
             - depth >= 0
-            - opening_book points to a csv file created by opening_book_gen.save_opening_book
+            - opening_book points to a csv file created by opening_book_gen.save_opening_book or
+              a binary file created by opening_book_gen.save_binary_opening_book
+            - time_limit_ms is None or time_limit_ms > 0
+            - book_plies is None or book_plies >= 0
+            - table_size_mb >= 1
+            - workers >= 1
+            - 0 <= endgame_threshold <= ROWS * COLUMNS
         """
         self.is_human = False
         self._depth = depth
+        self._time_limit_ms = time_limit_ms
+        self._deadline = None
+        self._root_move_number = -1
+        self._move_ordering = _MoveOrdering()
+        self._endgame_threshold = endgame_threshold
+        self._canonical_hash = canonical_hash
+        self._collect_stats = collect_stats or stats_file is not None
+        self._stats_file = stats_file
+        self._stats = None
+        self.last_stats = None
+        self._nodes = 0
+        self._search_depth = None
+        self._searching = False
+        self._stopped = False
+        self._stop_requested = False
+        self._stop_lock = threading.Lock()
+        self._ponder = ponder
+        self._ponder_thread = None
+        self._pondering = False
+        self._ponder_results = {}
+        self._pondering_hash = None
+        self._ponder_target = None
+        if endgame_threshold > 0:
+            self._endgame_solver = EndgameSolver(table_size_mb)
+        else:
+            self._endgame_solver = None
 
-        if opening_book is None:
-            if depth == 5:
-                path = 'data\opening_books\opening_book_5.csv'
-                self._transposition_table = opening_book_gen.load_opening_book(path)
-            elif depth == 6:
-                path = 'data\opening_books\opening_book_6.csv'
-                self._transposition_table = opening_book_gen.load_opening_book(path)
-            elif depth == 7:
-                path = 'data\opening_books\opening_book_7.csv'
-                self._transposition_table = opening_book_gen.load_opening_book(path)
-            else:
-                self._transposition_table = {}
+        if opening_book is not None and opening_book.endswith('.bin'):
+            self._opening_book = opening_book_gen.BinaryOpeningBook(opening_book)
+        else:
+            self._opening_book = None
+
+        if workers > 1:
+            # Each process opens the binary opening book itself, but they all share its memory
+            self._transposition_table = TranspositionTable(table_size_mb, shared=True)
+            self._pool = ProcessPoolExecutor(workers, initializer=AIPlayerComplex._start_worker,
+                                             initargs=(self._transposition_table.name,
+                                                       table_size_mb, self._opening_book.file
+                                                       if self._opening_book else None,
+                                                       canonical_hash))
+            weakref.finalize(self, self._pool.shutdown, cancel_futures=True)
+        else:
+            self._transposition_table = TranspositionTable(table_size_mb)
+            self._pool = None
+
+        if opening_book is not None and self._opening_book is None:
+            self._book_chunks = opening_book_gen.stream_opening_book(opening_book,
+                                                                     max_plies=book_plies)
         else:
-            self._transposition_table = opening_book_gen.load_opening_book(opening_book)
+            self._book_chunks = None
 
     def make_move(self, board: Board) -> int:
         """Returns a move that can be played in the game represented by the 'board' argument.
         Move selection is done using the 'minimax' function which uses the minimax algorithm with
         a depth of self.depth to decide on the best move to play.
+
+        If self._time_limit_ms is not None, the depth is instead increased one at a time until time
+        runs out. See self._iterative_deepening.
+
+        If there are fewer than self._endgame_threshold empty slots on the board, the move is
+        instead the perfect move found by self._endgame_solver.
+
+        If stats are being collected, the stats of the search are stored in self.last_stats.
+
+        If the AI has been pondering since its last move and already found the move for board,
+        that move is returned straight away. Otherwise, the pondering is stopped and the search
+        is done as normal, using everything the pondering stored in the transposition table.
+
+        If self.stop is called from another thread while the move is being chosen, SearchStopped
+        is raised instead, and board may be left part way through the search.
+        """
+        with self._stop_lock:
+            self._searching = True
+        start = time.perf_counter()
+        try:
+            move = self._finish_pondering(board)
+            self._nodes = 0
+            if self._collect_stats:
+                self._stats = SearchStats(board.move_number)
+                self._stats.ponder_hit = move is not None
+            if move is None:
+                move = self._choose_move(board)
+        except _SearchTimeout:
+            raise SearchStopped from None
+        finally:
+            stats, self._stats = self._stats, None
+            self._search_depth = None
+            with self._stop_lock:
+                self._searching = False
+                self._stopped = False
+                self._stop_requested = False
+
+        if stats is not None:
+            stats.nodes = self._nodes
+            stats.seconds = time.perf_counter() - start
+            self.last_stats = stats
+            if self._stats_file is not None:
+                self._save_stats(stats)
+
+        if self._ponder:
+            self._start_pondering(board, move)
+        return move
+
+    def stop(self) -> None:
+        """Stop the search make_move is doing in another thread as soon as possible, so that it
+        raises SearchStopped, and stop pondering. Calling this when no search is being done does
+        nothing, and does not affect the next search.
+
+        When the search is split between a pool of processes, the moves the pool is already
+        searching are finished before the search stops.
+        """
+        with self._stop_lock:
+            if self._searching or self._pondering:
+                self._stopped = True
+                self._stop_requested = True
+
+    def get_progress(self) -> Optional[tuple[int, int]]:
+        """Return a tuple of the depth the search make_move is doing in another thread is
+        searching to, and the number of boards it has searched so far. Returns None if no search
+        is being done, or the endgame solver is being used instead of minimax.
         """
-        move, evalutation = self.minimax(board, -math.inf, math.inf, self._depth, 1)
+        depth = self._search_depth
+        if depth is None:
+            return None
+        return depth, self._nodes
+
+    def _start_pondering(self, board: Board, move: int) -> None:
+        """Start pondering the board after 'move' is played on 'board', unless that move ends
+        the game or the AI would use the endgame solver after the opponent's reply. The solver
+        can not be stopped part way through, so pondering with it could keep make_move waiting
+        for a whole solve of a board the opponent did not play.
+
+        Pondering searches the board after each of the opponent's replies in a background
+        thread, one at a time, in the same way make_move would. The reply this AI's search
+        expects is searched first, as it is stored as the best move in the transposition table,
+        and the rest are searched in the order the move ordering would search them. The move
+        found for each board is kept in self._ponder_results, and every board searched is kept
+        in the transposition table, so the next call to make_move is much faster even if the
+        opponent made a reply that was not searched.
+
+        Preconditions:
+            - move in board.get_valid_moves()
+            - not self._pondering
+        """
+        if ROWS * COLUMNS - (board.move_number + 2) < self._endgame_threshold:
+            return
+        ponder_board = board.copy()
+        ponder_board.make_move(move)
+        if ponder_board.get_winner() is not None:
+            return
+
+        self._ponder_results = {}
+        with self._stop_lock:
+            self._pondering = True
+        self._ponder_thread = threading.Thread(target=self._ponder_replies, args=(ponder_board,),
+                                               daemon=True)
+        self._ponder_thread.start()
+
+    def _ponder_replies(self, board: Board) -> None:
+        """Search the board after each of the opponent's replies on 'board', as described in
+        self._start_pondering. This is run in self._ponder_thread. It stops once every reply has
+        been searched, make_move has been called, or stop has been called.
+
+        Preconditions:
+            - board.get_winner() is None
+        """
+        if self._canonical_hash:
+            key, mirrored = board.get_canonical_hash()
+        else:
+            key, mirrored = board.hash, False
+        entry = self._transposition_table.probe(key)
+        expected_reply = None
+        if entry is not None and entry[3] is not None:
+            expected_reply = COLUMNS - 1 - entry[3] if mirrored else entry[3]
+
+        try:
+            for reply in self._move_ordering.order(board, board.get_valid_moves(), expected_reply):
+                board.make_move(reply)
+                if board.get_winner() is None:
+                    with self._stop_lock:
+                        if self._ponder_target is not None or self._stopped:
+                            return
+                        self._pondering_hash = board.hash
+                    self._ponder_results[board.hash] = self._choose_move(board)
+                board.un_move(reply)
+        except _SearchTimeout:
+            pass
+        finally:
+            with self._stop_lock:
+                self._pondering = False
+                self._pondering_hash = None
+                # When make_move is waiting for this thread, it decides what to do with these
+                if not self._searching:
+                    self._stopped = False
+                    self._stop_requested = False
+                    self._search_depth = None
+
+    def _finish_pondering(self, board: Board) -> Optional[int]:
+        """Stop the pondering started after the AI's last move, and return the move it found for
+        'board', or None if it did not find one. If pondering is searching 'board', that search
+        is finished first instead of being stopped.
+
+        Raises _SearchTimeout if self.stop was called before the pondering stopped.
+        """
+        if self._ponder_thread is None:
+            return None
+
+        with self._stop_lock:
+            self._ponder_target = board.hash
+            if self._pondering_hash != board.hash:
+                self._stopped = True
+        self._ponder_thread.join()
+
+        with self._stop_lock:
+            self._ponder_thread = None
+            self._ponder_target = None
+            self._stopped = self._stop_requested
+        if self._stopped:
+            raise _SearchTimeout
+        return self._ponder_results.get(board.hash)
+
+    def _choose_move(self, board: Board) -> int:
+        """Return the move chosen for 'board' as described in self.make_move."""
+        if ROWS * COLUMNS - board.move_number < self._endgame_threshold:
+            if self._stats is not None:
+                self._stats.endgame = True
+            return self._endgame_solver.best_move(board)[0]
+
+        # Entries from earlier moves are kept, but can now be replaced by new ones
+        self._transposition_table.new_search()
+        self._move_ordering.new_search()
+        self._root_move_number = board.move_number
+        self._load_opening_book(_BOOK_LOAD_SECONDS)
+
+        if self._time_limit_ms is not None:
+            return self._iterative_deepening(board)
+
+        start = time.perf_counter()
+        self._search_depth = self._depth
+        move, evalutation = self.minimax(board, -math.inf, math.inf, self._depth,
+                                         board.get_active_player())
+        self._record_depth(self._depth, 0, start)
         return move
 
-    def minimax(self, board: Board, alpha: int, beta: int, depth: int, color: int) -> (int, int):
+    def _save_stats(self, stats: SearchStats) -> None:
+        """Add 'stats' to the end of self._stats_file as a line of JSON.
+
+        Preconditions:
+            - self._stats_file is not None
+        """
+        with open(self._stats_file, 'a') as stats_file:
+            stats_file.write(stats.to_json() + '\n')
+
+    def _load_opening_book(self, seconds: float) -> None:
+        """Load chunks of the csv opening book into the transposition table until all of it has
+        been loaded or 'seconds' seconds have passed. At least one chunk is loaded if there are
+        any left.
+        """
+        if self._book_chunks is None:
+            return
+
+        deadline = time.perf_counter() + seconds
+        for chunk in self._book_chunks:
+            self._transposition_table.load(chunk)
+            if time.perf_counter() >= deadline:
+                return
+        self._book_chunks = None
+
+    def _iterative_deepening(self, board: Board) -> int:
+        """Returns the best move found for 'board' by searching with minimax at a depth of 1, 2, 3
+        and so on, stopping once self._depth is reached or self._time_limit_ms milliseconds have
+        passed. The move from the deepest search that was finished is returned. The search at a
+        depth of 1 is always finished, so that there is always a move to return.
+
+        The transposition table is kept between each search, and each search tries the best move
+        from the previous one first. This makes each search much faster than it would be on its
+        own, so very little time is lost by searching the shallower depths first.
+
+        Preconditions:
+            - board.get_valid_moves() != []
+        """
+        deadline = time.perf_counter() + self._time_limit_ms / 1000
+
+        # The search is done on a copy of the board, so that stopping it part way through does
+        # not leave the real board with moves on it that were never undone
+        search_board = board.copy()
+
+        # There is no point searching deeper than the number of moves left in the game
+        max_depth = min(self._depth, ROWS * COLUMNS - board.move_number)
+
+        color = board.get_active_player()
+        start = time.perf_counter()
+        self._search_depth = 1
+        best_move = self.minimax(search_board, -math.inf, math.inf, 1, color)[0]
+        self._record_depth(1, 0, start)
+        depth = 2
+
+        self._deadline = deadline
+        try:
+            while depth <= max_depth:
+                start = time.perf_counter()
+                nodes = self._nodes
+                self._search_depth = depth
+                best_move = self.minimax(search_board, -math.inf, math.inf, depth, color,
+                                         first_move=best_move)[0]
+                self._record_depth(depth, nodes, start)
+                depth += 1
+        except _SearchTimeout:
+            # Running out of time means the deepest finished search's move is played, but being
+            # stopped means no move is played at all
+            if self._stopped:
+                raise
+        finally:
+            self._deadline = None
+
+        return best_move
+
+    def _record_depth(self, depth: int, nodes: int, start: float) -> None:
+        """Record in self._stats that a search to a depth of 'depth' finished, which started
+        at the time 'start' when nodes boards had been searched, if stats are being collected.
+        """
+        if self._stats is not None:
+            self._stats.depths.append((depth, self._nodes - nodes, time.perf_counter() - start))
+
+    def minimax(self, board: Board, alpha: int, beta: int, depth: int, color: int,
+                first_move: Optional[int] = None) -> (int, int):
         """This function implements the minimax algorithm with alpha-beta pruning and a
         transposition table with a depth of 'depth'. This algorithm uses recursion to explore the
         tree like structure of all the possible games that could happen from the current 'board'
         state and will eventually return a tuple of ints containing the best move in for the player
-        with color 'color' and the evaluation of how good the resulting position will be
-        for the player.
+        with color 'color' and the evaluation of how good the resulting position will be. The
+        evaluation is always from red's point of view, so red tries to maximise it and yellow
+        tries to minimise it.
 
         While board is mutated many MANY times during the running of this function, it when the
         function is finished, it will always be in the exact same state is was in when it was
-        first called.
+        first called. The only exception is when the search runs out of time or is stopped, in
+        which case _SearchTimeout is raised and the board is left part way through the search.
+
+        If first_move is given, it is tried before any of the other moves.
 
         Preconditions:
             - depth >= 0
-            - color in {-1, 1}
+            - color == board.get_active_player()
         """
+        if self._stopped or (self._deadline is not None and time.perf_counter() >= self._deadline):
+            raise _SearchTimeout
+        self._nodes += 1
+        stats = self._stats
+
         possible_moves = board.get_valid_moves()
 
-        for move in possible_moves:  # Checks to see if there is a win in any of the next moves
-            board.make_move(move)  # Mutating the board in this way is faster than creating copies
-            winner = board.get_winner()
-            if winner == 1:
-                board.un_move(move)
-                return move, 1000000
-            elif winner == -1:
-                board.un_move(move)
-                return move, -1000000
-            elif winner == 0:
-                board.un_move(move)
-                return move, 0
-            board.un_move(move)  # Undoes the move so the next moves can be tried
+        # Checks to see if there is a win in any of the next moves. The board finds all of them
+        # at once, which is much faster than making and undoing every move to check for a winner
+        winning_moves = board.get_winning_moves()
+        if winning_moves:
+            return winning_moves[0], 1000000 * board.get_active_player()
+        if board.move_number == ROWS * COLUMNS - 1:
+            return possible_moves[0], 0  # The only move left fills the board, so it is a draw
 
         if len(possible_moves) == 0 or depth == 0:
             if depth == 0:  # If depth is 0, we must stop recursion use a heuristic evaluation
-                return None, board.evaluate_score(color)
+                # Like the values of wins above, this is always from red's point of view, so that
+                # red maximises it and yellow minimises it no matter how deep the search is
+                if stats is not None:
+                    stats.leaf_evaluations += 1
+                return None, board.evaluate_score(1)
             else:
                 return None, 0  # Game is a draw
 
-        if color == 1:  # AI/red is color 1
-            return self._max_player(board, alpha, beta, depth)
+        # Checks to see if this board is in the transposition table, if it is, we can save time by
+        # not computing it again. The board the search started from is always searched, so that a
+        # move is always found for it
+        original_alpha, original_beta = alpha, beta
+        if self._canonical_hash:
+            key, mirrored = board.get_canonical_hash()
+        else:
+            key, mirrored = board.hash, False
+        entry = self._transposition_table.probe(key)
+        if stats is not None:
+            stats.tt_probes += 1
+            stats.tt_hits += entry is not None
+        if entry is None and self._opening_book is not None:
+            entry = self._opening_book.probe(key)
+            if stats is not None and entry is not None:
+                stats.book_hits += 1
+        hash_move = None
+        if entry is not None:
+            value, flag, entry_depth, hash_move = entry
+            if mirrored and hash_move is not None:
+                hash_move = COLUMNS - 1 - hash_move
+            if entry_depth >= depth and board.move_number != self._root_move_number:
+                if flag == EXACT:
+                    return hash_move, value
+                elif flag == LOWER:
+                    alpha = max(alpha, value)
+                else:
+                    beta = min(beta, value)
+                if alpha >= beta:
+                    return hash_move, value
+
+        # Even when the entry can not be used for the value of the board, its best move is
+        # probably still the best move, so it is tried first
+        possible_moves = self._move_ordering.order(board, possible_moves, hash_move)
+        if first_move is not None and first_move in possible_moves:
+            possible_moves.remove(first_move)
+            possible_moves.insert(0, first_move)
+
+        if self._pool is not None and depth >= 2 and board.move_number == self._root_move_number:
+            best_move, value = self._parallel_player(board, alpha, beta, depth, color,
+                                                     possible_moves)
+
+        elif color == 1:  # Red is color 1, and is the maximising player
+            best_move, value = self._max_player(board, alpha, beta, depth, possible_moves)
 
         else:  # Otherwise, it is yellows/human players turn
-            return self._min_player(board, alpha, beta, depth)
+            best_move, value = self._min_player(board, alpha, beta, depth, possible_moves)
+
+        # If the value is outside the window, the search was cut short and so it is only a bound
+        if value <= original_alpha:
+            flag = UPPER
+        elif value >= original_beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+
+        # Saves this value into the table so it doesn't need to be calculated again
+        if stats is not None:
+            stats.tt_stores += 1
+        if mirrored:
+            self._transposition_table.store(key, value, flag, depth, COLUMNS - 1 - best_move)
+        else:
+            self._transposition_table.store(key, value, flag, depth, best_move)
+        return best_move, value
 
-    def _min_player(self, board: Board, alpha: int, beta: int, depth: int) -> (int, int):
+    def _min_player(self, board: Board, alpha: int, beta: int, depth: int,
+                    possible_moves: list[int]) -> (int, int):
         """This function uses the minimax algorithm with depth 'depth', to determine the move that
-        results in the best position for the minimising player. It uses alpha-beta pruning
-        and a transposition table to help cut down on running time. It eventually returns the best
-        move and the evaluation it gives of the board after it is played.
+        results in the best position for the minimising player. It uses alpha-beta pruning to
+        help cut down on running time. It eventually returns the best move and the evaluation it
+        gives of the board after it is played. The moves are tried in the order they appear in
+        possible_moves.
 
         Preconditions:
-            - depth >= 0
+            - depth >= 1
+            - possible_moves contains every move in board.get_valid_moves()
         """
-        base_beta = beta
         value = math.inf
-        best_move = 0
-        possible_moves = board.get_valid_moves()
+        best_move = possible_moves[0]
         for move in possible_moves:
             board.make_move(move)
+            score = self.minimax(board, alpha, beta, depth - 1, 1)[1]
+            board.un_move(move)
 
-            # Checks to see if this board is in the transposition table, if it is,
-            # We can save time by not computing it again
-            if board.hash in self._transposition_table and self._transposition_table[board.hash][2] >= depth:
-                entry = self._transposition_table[board.hash]
-                if entry[1] == 'exact':
-                    score = entry[0]
-                    if score < value:
-                        value = score
-                        best_move = move
-                elif entry[1] == 'low':
-                    alpha = max(alpha, entry[0])
-                elif entry[1] == 'high':
-                    beta = min(beta, entry[0])
-            else:  # If it's not in the table, we need to calculate it
-                score = self.minimax(board, alpha, beta, depth - 1, 1)[1]
-                if score < value:
-                    value = score
-                    best_move = move
+            if score < value:
+                value = score
+                best_move = move
             beta = min(value, beta)
             if alpha >= beta:
-                if value <= alpha:
-                    entry = (value, 'high', depth)
-                elif value >= base_beta:
-                    entry = (value, 'low', depth)
-                else:
-                    entry = (value, 'exact', depth)
+                self._move_ordering.record_cutoff(board, move, depth)
+                self._record_cutoff(move == possible_moves[0])
+                break
 
-                # Saves this value into the table so it doesn't need to be calculated again
-                self._transposition_table[board.hash] = entry
-                board.un_move(move)
-                return move, value
-            else:
-                board.un_move(move)
+        return best_move, value
+
+    def _max_player(self, board: Board, alpha: int, beta: int, depth: int,
+                    possible_moves: list[int]) -> (int, int):
+        """This function uses the minimax algorithm with depth 'depth', to determine the move that
+        results in the best position for the maximising player. It uses alpha-beta pruning to
+        help cut down on running time. It eventually returns the best move and the evaluation it
+        gives of the board after it is played. The moves are tried in the order they appear in
+        possible_moves.
+
+        Preconditions:
+            - depth >= 1
+            - possible_moves contains every move in board.get_valid_moves()
+        """
+        value = -math.inf
+        best_move = possible_moves[0]
+        for move in possible_moves:
+            board.make_move(move)
+            score = self.minimax(board, alpha, beta, depth - 1, -1)[1]
+            board.un_move(move)
 
-        # Mutates the board, and thus it's hash, to save and use to store in the table
+            if score > value:
+                value = score
+                best_move = move
+            alpha = max(value, alpha)
+            if alpha >= beta:
+                self._move_ordering.record_cutoff(board, move, depth)
+                self._record_cutoff(move == possible_moves[0])
+                break
+
+        return best_move, value
+
+    def _record_cutoff(self, first_move: bool) -> None:
+        """Record in self._stats that the rest of the moves on a board were pruned, if stats are
+        being collected. first_move is True if the first move searched caused the cutoff.
+        """
+        if self._stats is not None:
+            self._stats.cutoffs += 1
+            if first_move:
+                self._stats.first_move_cutoffs += 1
+
+    def _parallel_player(self, board: Board, alpha: int, beta: int, depth: int, color: int,
+                         possible_moves: list[int]) -> (int, int):
+        """This function returns the same evaluation as self._max_player when color is 1, and as
+        self._min_player otherwise, but splits the search between the processes in self._pool.
+        When several moves are equally good, the move returned may be a different one of them.
+
+        The first move is searched in this process, as it is usually the best one, and its
+        evaluation gives a bound on alpha (for red) or beta (for yellow) that lets the other moves
+        be searched much faster. The rest of the moves are then all searched at the same time by
+        the pool, using that bound. Every process uses the same shared transposition table, so
+        boards that one process has already searched do not need to be searched again by any of
+        the others.
+
+        The clocks of different processes can not be compared, so the pool is given the number of
+        seconds left before self._deadline instead of the deadline itself.
+
+        Preconditions:
+            - depth >= 2
+            - color == board.get_active_player()
+            - possible_moves contains every move in board.get_valid_moves()
+            - self._pool is not None
+        """
+        best_move = possible_moves[0]
         board.make_move(best_move)
-        hash_value = board.hash
+        value = self.minimax(board, alpha, beta, depth - 1, -color)[1]
         board.un_move(best_move)
 
-        if value <= alpha:
-            entry = (value, 'high', depth)
-        elif value >= base_beta:
-            entry = (value, 'low', depth)
+        if color == 1:
+            alpha = max(value, alpha)
         else:
-            entry = (value, 'exact', depth)
+            beta = min(value, beta)
+        if alpha >= beta:
+            return best_move, value
+
+        if self._deadline is None:
+            seconds_left = None
+        else:
+            seconds_left = self._deadline - time.perf_counter()
+        root = board.copy()
+        futures = [self._pool.submit(AIPlayerComplex._search_in_worker, root, move, alpha, beta,
+                                     depth - 1, -color, seconds_left)
+                   for move in possible_moves[1:]]
+        try:
+            for move, future in zip(possible_moves[1:], futures):
+                score = future.result()
+                if score is None:
+                    raise _SearchTimeout
+                if score * color > value * color:
+                    value = score
+                    best_move = move
+        finally:
+            for future in futures:
+                future.cancel()
 
-        # Saves this value into the table so it doesn't need to be calculated again
-        self._transposition_table[hash_value] = entry
         return best_move, value
 
-    def _max_player(self, board: Board, alpha: int, beta: int, depth: int) -> (int, int):
-        """This function uses the minimax algorithm with depth 'depth', to determine the move that
-        results in the best position for the maximising player. It uses alpha-beta pruning
-        and a transposition table to help cut down on running time. It eventually returns the best
-        move and the evaluation it gives of the board after it is played.
+    @staticmethod
+    def _start_worker(table_name: str, table_size_mb: float, opening_book: Optional[str],
+                      canonical_hash: bool) -> None:
+        """Set up a process in the pool of an AIPlayerComplex with more than one worker, by
+        creating the player that does the searches in this process. It uses the shared
+        transposition table with the name table_name, and the binary opening book opening_book
+        if it is not None.
+        """
+        global _search_worker
+        _search_worker = AIPlayerComplex(depth=0, opening_book=opening_book, table_size_mb=1,
+                                         endgame_threshold=0, canonical_hash=canonical_hash)
+        _search_worker._transposition_table = TranspositionTable(table_size_mb, name=table_name)
+
+    @staticmethod
+    def _search_in_worker(board: Board, move: int, alpha: int, beta: int, depth: int,
+                          color: int, seconds_left: Optional[float]) -> Optional[int]:
+        """Return the evaluation of the board after 'move' is played on 'board', found with the
+        minimax algorithm with a depth of 'depth' by this process's search worker, where color is
+        the player whose turn it is after the move. Returns None if the search did not finish
+        within seconds_left seconds, if it is not None.
 
         Preconditions:
-            - depth >= 0
+            - This is called in a process set up by AIPlayerComplex._start_worker
+            - move in board.get_valid_moves()
+            - color == -board.get_active_player()
+        """
+        board.make_move(move)
+        if seconds_left is None:
+            _search_worker._deadline = None
+        else:
+            _search_worker._deadline = time.perf_counter() + seconds_left
+        try:
+            return _search_worker.minimax(board, alpha, beta, depth, color)[1]
+        except _SearchTimeout:
+            return None
+
+
+class AIPlayerNegamax(Player):
+    """An implementation of the abstract class Player that searches the same tree as
+    AIPlayerComplex, but with a single negamax search instead of separate functions for each
+    player. On top of alpha-beta pruning and a transposition table, it uses principal variation
+    search and aspiration windows, which let it prove most moves are worse than the best one
+    without finding out exactly how much worse they are. This means it visits far fewer boards
+    than AIPlayerComplex to find the same move at the same depth.
+
+    Details on negamax can be found here: https://en.wikipedia.org/wiki/Negamax
+    Details on principal variation search can be found here:
+    https://en.wikipedia.org/wiki/Principal_variation_search
+    Details on aspiration windows can be found here:
+    https://www.chessprogramming.org/Aspiration_Windows
+
+    Representation Invariants:
+        - self._depth >= 1
+    """
+    # Private Instance Attributes:
+    #   - _depth: this is the depth that the search will use. This is measure of how many
+    #            moves ahead the AI will look on any given turn.
+    #   - _transposition_table: This is a table that maps the hash of a board to the evaluation of
+    #   that board for the player whose turn it is on that board, a flag that says whether the
+    #   value is exact, an upperbound, or a lower bound, the depth the value was calculated at, and
+    #   the best move.
+    #   - _previous_value: this is the evaluation found by the last search this player did, or
+    #   None if it has not searched yet. It is used as the centre of the next aspiration window.
+    #   - _move_ordering: this decides what order the moves on each board are searched in, using
+    #   the best moves stored in the transposition table, killer moves, and history scores.
+    #   - _canonical_hash: this is True when boards are looked up in the transposition table by
+    #   their canonical hash, so that a board and its mirror image share an entry.
+    _depth: int
+    _transposition_table: TranspositionTable
+    _previous_value: Optional[int]
+    _move_ordering: '_MoveOrdering'
+    _canonical_hash: bool
+
+    def __init__(self, depth: int = 6, table_size_mb: float = 16,
+                 canonical_hash: bool = True) -> None:
+        """Creates a new instance of the AIPlayerNegamax class with an empty transposition table
+        that uses at most table_size_mb megabytes of memory.
+
+        If canonical_hash is True, a board and its mirror image share one entry in the
+        transposition table. See Board.get_canonical_hash.
+
+        Preconditions:
+            - depth >= 1
+            - table_size_mb >= 1
+        """
+        self.is_human = False
+        self._depth = depth
+        self._transposition_table = TranspositionTable(table_size_mb)
+        self._previous_value = None
+        self._move_ordering = _MoveOrdering()
+        self._canonical_hash = canonical_hash
+
+    def make_move(self, board: Board) -> int:
+        """Returns a move that can be played in the game represented by the 'board' argument.
+        Move selection is done using the 'search' function with a depth of self._depth.
+
+        Preconditions:
+            - board.get_valid_moves() != []
+        """
+        self._transposition_table.new_search()
+        self._move_ordering.new_search()
+        move, evaluation = self.search(board, self._depth)
+        return move
+
+    def search(self, board: Board, depth: int) -> (int, int):
+        """Returns a tuple of the best move for the player whose turn it is on 'board' and the
+        evaluation of the board for that player, searching 'depth' moves ahead.
+
+        The evaluation usually changes very little from one move to the next, so if this player
+        has searched before, the search only looks for evaluations in a small window around the
+        last one it found (an aspiration window). This lets far more of the tree be pruned. If
+        the evaluation turns out to be outside that window, the board is searched again with no
+        window.
+
+        board is left in the same state it was in when this function was called.
+
+        Preconditions:
+            - depth >= 1
+            - board.get_valid_moves() != []
+        """
+        if self._previous_value is None:
+            move, value = self._search_root(board, -_INFINITY, _INFINITY, depth)
+        else:
+            alpha = self._previous_value - _ASPIRATION_WINDOW
+            beta = self._previous_value + _ASPIRATION_WINDOW
+            move, value = self._search_root(board, alpha, beta, depth)
+            if value <= alpha or value >= beta:
+                move, value = self._search_root(board, -_INFINITY, _INFINITY, depth)
+
+        self._previous_value = value
+        return move, value
+
+    def _search_root(self, board: Board, alpha: int, beta: int, depth: int) -> (int, int):
+        """Returns a tuple of the best move on 'board' and its evaluation, in the same way as
+        self._negamax. The moves are tried in the order given by board.get_valid_moves(), and when
+        two moves are equally good, the first one is returned.
+
+        Preconditions:
+            - depth >= 1
+            - board.get_valid_moves() != []
         """
-        base_alpha = alpha
-        value = -math.inf
-        best_move = 0
         possible_moves = board.get_valid_moves()
+
+        winning_moves = board.get_winning_moves()
+        if winning_moves:
+            return winning_moves[0], _WIN_SCORE
+        if board.move_number == ROWS * COLUMNS - 1:
+            return possible_moves[0], 0
+
+        best_move, best_value = possible_moves[0], -_INFINITY
         for move in possible_moves:
             board.make_move(move)
+            if best_value == -_INFINITY:
+                value = -self._negamax(board, -beta, -alpha, depth - 1)
+            else:
+                value = -self._negamax(board, -alpha - 1, -alpha, depth - 1)
+                if alpha < value < beta:
+                    value = -self._negamax(board, -beta, -value, depth - 1)
+            board.un_move(move)
+
+            if value > best_value:
+                best_move, best_value = move, value
+                alpha = max(alpha, value)
+                if alpha >= beta:
+                    break
+
+        return best_move, best_value
 
-            # Checks to see if this board is in the transposition table, if it is,
-            # We can save time by not computing it again
-            if board.hash in self._transposition_table and self._transposition_table[board.hash][2] >= depth:
-                entry = self._transposition_table[board.hash]
-                if entry[1] == 'exact':
-                    score = entry[0]
-                    if score > value:
-                        value = score
-                        best_move = move
-                elif entry[1] == 'low':
+    def _negamax(self, board: Board, alpha: int, beta: int, depth: int) -> int:
+        """Returns the evaluation of 'board' for the player whose turn it is, searching 'depth'
+        moves ahead. If the evaluation is at most alpha, the value returned is only an upper bound
+        on it, and if it is at least beta, the value returned is only a lower bound on it.
+
+        The first move is searched with the full window from alpha to beta. Every other move is
+        first searched with an empty window just above alpha, which only shows whether it is
+        better than the best move so far. This is much faster than a full search, and the move is
+        only searched again with the full window if it turns out to be better.
+
+        Preconditions:
+            - depth >= 0
+            - board.get_winner() is None
+        """
+        # A win for the player whose turn it is on the next move
+        if board.get_winning_moves():
+            return _WIN_SCORE
+        if board.move_number == ROWS * COLUMNS - 1:
+            return 0  # The only move left fills the board, so it is a draw
+        if depth == 0:
+            return board.evaluate_score(board.get_active_player())
+
+        original_alpha, original_beta = alpha, beta
+        if self._canonical_hash:
+            key, mirrored = board.get_canonical_hash()
+        else:
+            key, mirrored = board.hash, False
+        entry = self._transposition_table.probe(key)
+        hash_move = None
+        if entry is not None:
+            hash_move = entry[3]
+            if mirrored and hash_move is not None:
+                hash_move = COLUMNS - 1 - hash_move
+            if entry[2] >= depth:
+                if entry[1] == EXACT:
+                    return entry[0]
+                elif entry[1] == LOWER:
                     alpha = max(alpha, entry[0])
-                elif entry[1] == 'high':
-                    beta = min(beta, entry[0])
-            else:  # If it's not in the table, we need to calculate it
-                score = self.minimax(board, alpha, beta, depth - 1, -1)[1]
-                if score > value:
-                    value = score
-                    best_move = move
-            alpha = max(value, alpha)
-            if alpha >= beta:
-                if value <= base_alpha:
-                    entry = (value, 'high', depth)
-                elif value >= beta:
-                    entry = (value, 'low', depth)
                 else:
-                    entry = (value, 'exact', depth)
+                    beta = min(beta, entry[0])
+                if alpha >= beta:
+                    return entry[0]
 
-                # Saves this value into the table so it doesn't need to be calculated again
-                self._transposition_table[board.hash] = entry
-                board.un_move(move)
-                return best_move, value
+        best_move, best_value = None, -_INFINITY
+        for move in self._move_ordering.order(board, board.get_valid_moves(), hash_move):
+            board.make_move(move)
+            if best_value == -_INFINITY:
+                value = -self._negamax(board, -beta, -alpha, depth - 1)
             else:
-                board.un_move(move)
+                value = -self._negamax(board, -alpha - 1, -alpha, depth - 1)
+                if alpha < value < beta:
+                    value = -self._negamax(board, -beta, -value, depth - 1)
+            board.un_move(move)
 
-        # Mutates the board, and thus it's hash, to save and use to store in the table
-        board.make_move(best_move)
-        hash_value = board.hash
-        board.un_move(best_move)
+            if value > best_value:
+                best_move, best_value = move, value
+                alpha = max(alpha, value)
+                if alpha >= beta:
+                    self._move_ordering.record_cutoff(board, move, depth)
+                    break
 
-        if value <= base_alpha:
-            entry = (value, 'high', depth)
-        elif value >= beta:
-            entry = (value, 'low', depth)
+        # The flag is decided with the window this was called with, as the entry from the table may
+        # have narrowed it
+        if best_value <= original_alpha:
+            flag = UPPER
+        elif best_value >= original_beta:
+            flag = LOWER
         else:
-            entry = (value, 'exact', depth)
+            flag = EXACT
+        if mirrored:
+            best_move = COLUMNS - 1 - best_move
+        self._transposition_table.store(key, best_value, flag, depth, best_move)
 
-        # Saves this value into the table so it doesn't need to be calculated again
-        self._transposition_table[hash_value] = entry
-        return best_move, value
+        return best_value
+
+
+class AIPlayerMCTS(Player):
+    """An implementation of the abstract class Player that uses Monte Carlo tree search to choose
+    its moves. Instead of evaluating boards with a heuristic, it plays many random games
+    (playouts) from the current board, and grows a tree of the moves that led to them. Each
+    playout starts by following the tree from its root, choosing the child of each node with the
+    UCT formula, which balances moves that have done well in earlier playouts against moves that
+    have not been tried much yet. The move that was played the most at the root is chosen.
+
+    The tree is kept between moves. When this player is asked for its next move, the part of the
+    tree under its last move and the other player's reply is used as the new tree, so the
+    playouts from the last search are not wasted.
+
+    The nodes of the tree are not objects. Instead, each node is an index into several arrays
+    that store its parent, children, number of visits and total result.
+
+    Details on Monte Carlo tree search can be found here:
+    https://en.wikipedia.org/wiki/Monte_Carlo_tree_search
+
+    Representation Invariants:
+        - self._iterations is not None or self._time_limit_ms is not None
+        - len(self._parents) == len(self._visits) == len(self._wins) >= 1
+        - len(self._children) == COLUMNS * len(self._visits)
+    """
+    # Private Instance Attributes:
+    #   - _iterations: this is the number of playouts done for each move, or None if the number
+    #            of playouts is only limited by _time_limit_ms.
+    #   - _time_limit_ms: this is the longest time in milliseconds that the playouts for a move
+    #            can take, or None if only _iterations limits them.
+    #   - _exploration: this is the constant in the UCT formula. Larger values make the search
+    #            try moves that have not done well more often.
+    #   - _parents: this is an array that maps each node to its parent, or -1 for the root. The
+    #            root is always node 0.
+    #   - _children: this is an array that stores the children of each node, where
+    #            _children[node * COLUMNS + move] is the child reached by making 'move' from
+    #            'node', or -1 if that child has not been added to the tree yet.
+    #   - _visits: this is an array of the number of playouts that have gone through each node.
+    #   - _wins: this is an array of the total result of the playouts that have gone through each
+    #            node, for the player who made the move that reached the node. A win is worth 1,
+    #            a draw is worth 0.5, and a loss is worth 0.
+    #   - _root_array: this is the board_array (as nested lists) of the board after this
+    #            player's last move, which the root of the tree represents, or None if there is no
+    #            tree yet.
+    _iterations: Optional[int]
+    _time_limit_ms: Optional[int]
+    _exploration: float
+    _parents: array
+    _children: array
+    _visits: array
+    _wins: array
+    _root_array: Optional[list[list[int]]]
+
+    def __init__(self, iterations: Optional[int] = 2000, time_limit_ms: Optional[int] = None,
+                 exploration: float = math.sqrt(2)) -> None:
+        """Creates a new instance of AIPlayerMCTS that does 'iterations' playouts for each move,
+        or as many as it can in time_limit_ms milliseconds. If both are given, it stops at
+        whichever limit is reached first. At least one playout is always done.
+
+        Preconditions:
+            - iterations is not None or time_limit_ms is not None
+            - iterations is None or iterations >= 0
+            - time_limit_ms is None or time_limit_ms > 0
+            - exploration >= 0
+        """
+        self.is_human = False
+        self._iterations = iterations
+        self._time_limit_ms = time_limit_ms
+        self._exploration = exploration
+        self._clear_tree()
+
+    def make_move(self, board: Board) -> int:
+        """Returns a move that can be played in the game represented by the 'board' argument,
+        chosen by Monte Carlo tree search. board is not mutated.
+
+        Preconditions:
+            - board.get_valid_moves() != []
+        """
+        self._find_root(board)
+
+        # The playouts are done on a copy that does not keep the counts used by evaluate_score
+        # up to date, as they are never used here and slow down every move
+        search_board = Board(board.board_array.tolist(), board.get_active_player() == 1,
+                             incremental_eval=False)
+        if self._time_limit_ms is not None:
+            deadline = time.perf_counter() + self._time_limit_ms / 1000
+        else:
+            deadline = math.inf
+
+        # At least one playout is always done, even if the time limit runs out first, so that the
+        # root always has a child to choose
+        playouts = 0
+        while playouts == 0 or (self._iterations is None or playouts < self._iterations) \
+                and time.perf_counter() < deadline:
+            self._playout(search_board)
+            playouts += 1
+
+        move = max((move for move in search_board.get_valid_moves()
+                    if self._children[move] != -1),
+                   key=lambda m: self._visits[self._children[m]])
+
+        # The part of the tree under the chosen move is kept for the next move
+        self._reroot(self._children[move])
+        search_board.make_move(move)
+        self._root_array = search_board.board_array.tolist()
+        return move
+
+    def _playout(self, board: Board) -> None:
+        """Do one playout from 'board', which is the board the root of the tree represents. The
+        tree is followed until a node with a move that has not been tried is reached, that move
+        is added to the tree, and a random game is played from there. The result is then added
+        to every node on the way back up to the root.
+
+        board is left in the same state it was in when this function was called.
+
+        Preconditions:
+            - board.get_winner() is None
+        """
+        children = self._children
+        node = 0
+        moves = []
+        while board.get_winner() is None:
+            valid_moves = board.get_valid_moves()
+            untried = [move for move in valid_moves if children[node * COLUMNS + move] == -1]
+            if untried:
+                move = random.choice(untried)
+                board.make_move(move)
+                moves.append(move)
+                node = self._add_node(node, move)
+                break
+
+            move = self._select_move(node, valid_moves)
+            board.make_move(move)
+            moves.append(move)
+            node = children[node * COLUMNS + move]
+
+        # The moves of the random game are not added to the tree
+        playout_moves = []
+        while board.get_winner() is None:
+            move = random.choice(board.get_valid_moves())
+            board.make_move(move)
+            playout_moves.append(move)
+        winner = board.get_winner()
+        for move in reversed(playout_moves):
+            board.un_move(move)
+
+        # The colour of the player who made the move that reached the node
+        color = -board.get_active_player()
+        while node != -1:
+            self._visits[node] += 1
+            if winner == color:
+                self._wins[node] += 1
+            elif winner == 0:
+                self._wins[node] += 0.5
+            color = -color
+            node = self._parents[node]
+
+        for move in reversed(moves):
+            board.un_move(move)
+
+    def _select_move(self, node: int, valid_moves: list[int]) -> int:
+        """Return the move in valid_moves whose child of 'node' has the highest UCT score.
+
+        Preconditions:
+            - every move in valid_moves has a child of node in the tree
+        """
+        log_visits = math.log(self._visits[node])
+        best_move, best_score = valid_moves[0], -math.inf
+        for move in valid_moves:
+            child = self._children[node * COLUMNS + move]
+            visits = self._visits[child]
+            score = self._wins[child] / visits \
+                + self._exploration * math.sqrt(log_visits / visits)
+            if score > best_score:
+                best_move, best_score = move, score
+        return best_move
+
+    def _add_node(self, parent: int, move: int) -> int:
+        """Add a new node to the tree for the board reached by making 'move' from 'parent', and
+        return its index.
+        """
+        node = len(self._visits)
+        self._parents.append(parent)
+        self._children.extend([-1] * COLUMNS)
+        self._visits.append(0)
+        self._wins.append(0)
+        self._children[parent * COLUMNS + move] = node
+        return node
+
+    def _find_root(self, board: Board) -> None:
+        """Make the root of the tree represent 'board'. If board is the board after this
+        player's last move plus one more move by the other player, the child for that move
+        becomes the new root. Otherwise, the tree is cleared.
+        """
+        if self._root_array is not None:
+            current = board.board_array.tolist()
+            changes = [(row, col) for row in range(ROWS) for col in range(COLUMNS)
+                       if current[row][col] != self._root_array[row][col]]
+            if len(changes) == 1 and self._root_array[changes[0][0]][changes[0][1]] == 0:
+                child = self._children[changes[0][1]]
+                if child != -1:
+                    self._reroot(child)
+                    return
+        self._clear_tree()
+
+    def _reroot(self, node: int) -> None:
+        """Make 'node' the root of the tree, removing every node that is not under it. The
+        arrays are rebuilt so that they only hold the nodes that are kept, with node as node 0.
+        """
+        parents, children = array('i', [-1]), array('i')
+        visits, wins = array('i'), array('d')
+        kept = [node]
+        i = 0
+        while i < len(kept):
+            old = kept[i]
+            visits.append(self._visits[old])
+            wins.append(self._wins[old])
+            for move in range(COLUMNS):
+                child = self._children[old * COLUMNS + move]
+                if child == -1:
+                    children.append(-1)
+                else:
+                    children.append(len(kept))
+                    parents.append(i)
+                    kept.append(child)
+            i += 1
+
+        self._parents, self._children, self._visits, self._wins = parents, children, visits, wins
+
+    def _clear_tree(self) -> None:
+        """Remove every node from the tree except for a new root."""
+        self._parents = array('i', [-1])
+        self._children = array('i', [-1] * COLUMNS)
+        self._visits = array('i', [0])
+        self._wins = array('d', [0])
+        self._root_array = None
+
+
+class _MoveOrdering:
+    """A class that decides what order the moves on a board should be searched in. Alpha-beta
+    pruning cuts off the most of the tree when the best move is searched first, so the moves that
+    are most likely to be the best are put first:
+        1. The best move stored in the transposition table for the board (the 'hash move')
+        2. The 'killer moves': the last two moves that caused a cutoff on any board with the
+           same move number
+        3. The rest of the moves, ordered by their 'history score', which goes up every time a
+           move in that column causes a cutoff for that player. Moves with the same history score
+           stay in the order given by Board.get_valid_moves.
+
+    More information on these can be found here: https://www.chessprogramming.org/Move_Ordering
+    """
+    # Private Instance Attributes:
+    #   - _killer_moves: this is a list that maps a move number to a list of up to two moves that
+    #     most recently caused a cutoff on a board with that move number, newest first.
+    #   - _history: this is a list of two lists that map each column to its history score, the
+    #     first one for red and the second one for yellow.
+    _killer_moves: list[list[int]]
+    _history: list[list[int]]
+
+    def __init__(self) -> None:
+        """Creates a new instance of _MoveOrdering with no killer moves and no history."""
+        self._killer_moves = [[] for _ in range(ROWS * COLUMNS + 1)]
+        self._history = [[0] * COLUMNS, [0] * COLUMNS]
+
+    def new_search(self) -> None:
+        """Forget the killer moves, and halve the history scores so that older searches count
+        for less than newer ones. This should be called before each new search.
+        """
+        for killers in self._killer_moves:
+            killers.clear()
+        for scores in self._history:
+            for move in range(COLUMNS):
+                scores[move] //= 2
+
+    def order(self, board: Board, possible_moves: list[int],
+              hash_move: Optional[int]) -> list[int]:
+        """Return a new list of the moves in possible_moves, in the order they should be searched.
+
+        Preconditions:
+            - possible_moves contains every move in board.get_valid_moves()
+        """
+        if board.get_active_player() == 1:
+            scores = self._history[0]
+        else:
+            scores = self._history[1]
+
+        # Python's sort keeps moves with the same score in the same order, even when reversed
+        ordered = sorted(possible_moves, key=scores.__getitem__, reverse=True)
+
+        killers = self._killer_moves[board.move_number]
+        for move in reversed(killers):
+            if move in ordered:
+                ordered.remove(move)
+                ordered.insert(0, move)
+
+        if hash_move is not None and hash_move in ordered:
+            ordered.remove(hash_move)
+            ordered.insert(0, hash_move)
+
+        return ordered
+
+    def record_cutoff(self, board: Board, move: int, depth: int) -> None:
+        """Record that playing 'move' on 'board' caused a cutoff when searching with a depth of
+        'depth'. Deeper cutoffs prune more of the tree, so they increase the history score more.
+        """
+        killers = self._killer_moves[board.move_number]
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[2:]
+
+        if board.get_active_player() == 1:
+            self._history[0][move] += depth * depth
+        else:
+            self._history[1][move] += depth * depth
+
+
+class SearchStopped(Exception):
+    """Raised by AIPlayerComplex.make_move when its search was stopped by
+    AIPlayerComplex.stop before it chose a move.
+    """
+
+
+class _SearchTimeout(Exception):
+    """Raised by AIPlayerComplex.minimax when the current search has run out of time or has
+    been stopped.
+    """
 
 
 if __name__ == '__main__':
@@ -320,9 +1417,11 @@ if __name__ == '__main__':
 
     import python_ta
     python_ta.check_all(config={
-        'extra-imports': ['random', 'math', 'typing', 'board', 'opening_book_gen'],
+        'extra-imports': ['random', 'math', 'time', 'typing', 'board', 'opening_book_gen',
+                          'transposition_table', 'concurrent.futures', 'weakref', 'solver',
+                          'array', 'search_stats', 'threading'],
         # the names (strs) of imported modules
-        'allowed-io': [],
+        'allowed-io': ['AIPlayerComplex._save_stats'],
         # the names (strs) of functions that call print/open/input
         'max-line-length': 150,
         'disable': ['E1136', 'E9989', 'W1401']
@@ -0,0 +1,149 @@
+"""CSC111 Final Project: Exploring Using Graph Based Data Structures to Implement a Connect 4 AI
+
+Module Description
+==================
+
+This module contains the SearchStats class, which records what AIPlayerComplex's search did while
+choosing one move: how many boards it visited, how often it found them in its transposition table,
+how often alpha-beta pruning cut the search short, and how long each depth of the search took.
+Collecting them is turned off by default, and when it is off the search only has to check that no
+SearchStats is being filled in.
+
+The stats can be turned into a dict, or a line of JSON so that the stats for every move of many
+games can be saved to one file and read back with the json module.
+
+More information on these measurements can be found here:
+https://www.chessprogramming.org/Search_Statistics
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) 2021 Brian Cho and Luke Avveduto
+"""
+import json
+
+
+class SearchStats:
+    """The statistics of the search for one move.
+
+    Representation Invariants:
+        - self.tt_hits <= self.tt_probes
+        - self.first_move_cutoffs <= self.cutoffs
+        - sum(depth_nodes for _, depth_nodes, _ in self.depths) <= self.nodes
+    """
+    # Public Instance Attributes:
+    #   - move_number: the number of moves that had been made on the board the search was for
+    #   - endgame: True if the move was found by the endgame solver instead of minimax, in which
+    #     case none of the other counts are filled in
+    #   - ponder_hit: True if the move had already been found while pondering on the opponent's
+    #     time, in which case none of the other counts are filled in
+    #   - nodes: the number of boards minimax was called on
+    #   - leaf_evaluations: the number of boards given a heuristic evaluation because the search
+    #     had reached its depth
+    #   - tt_probes: the number of times a board was looked up in the transposition table
+    #   - tt_hits: the number of those times the board was found
+    #   - book_hits: the number of times a board that was not in the transposition table was found
+    #     in the binary opening book instead
+    #   - tt_stores: the number of entries stored in the transposition table
+    #   - cutoffs: the number of boards whose remaining moves were pruned by alpha-beta pruning
+    #   - first_move_cutoffs: the number of those where the first move searched caused the
+    #     cutoff, which happens more often the better the moves are ordered
+    #   - depths: a list of the depth, number of nodes visited and number of seconds taken by each
+    #     search to a single depth that finished, in the order they were done
+    #   - seconds: the number of seconds the whole search took
+    move_number: int
+    endgame: bool
+    ponder_hit: bool
+    nodes: int
+    leaf_evaluations: int
+    tt_probes: int
+    tt_hits: int
+    book_hits: int
+    tt_stores: int
+    cutoffs: int
+    first_move_cutoffs: int
+    depths: list[tuple[int, int, float]]
+    seconds: float
+
+    def __init__(self, move_number: int) -> None:
+        """Initialize a new SearchStats for a search from a board with move_number moves made,
+        with every count at 0.
+        """
+        self.move_number = move_number
+        self.endgame = False
+        self.ponder_hit = False
+        self.nodes = 0
+        self.leaf_evaluations = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.book_hits = 0
+        self.tt_stores = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.depths = []
+        self.seconds = 0.0
+
+    def tt_hit_rate(self) -> float:
+        """Return the fraction of transposition table probes that found the board, or 0 if
+        there were none.
+
+        >>> stats = SearchStats(0)
+        >>> stats.tt_probes, stats.tt_hits = 8, 2
+        >>> stats.tt_hit_rate()
+        0.25
+        """
+        return self.tt_hits / self.tt_probes if self.tt_probes else 0.0
+
+    def first_move_cutoff_rate(self) -> float:
+        """Return the fraction of cutoffs that were caused by the first move searched, or 0 if
+        there were none.
+        """
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def branching_factor(self) -> float:
+        """Return the effective branching factor of the search: how many times more nodes the
+        deepest search visited than the one before it. If only one depth was searched, this is
+        instead the number b where b ** depth is the number of nodes visited. It is 0 if no
+        depth was finished.
+
+        >>> stats = SearchStats(0)
+        >>> stats.depths = [(1, 7, 0.0), (2, 20, 0.0), (3, 60, 0.0)]
+        >>> stats.branching_factor()
+        3.0
+        """
+        if len(self.depths) >= 2:
+            return self.depths[-1][1] / max(self.depths[-2][1], 1)
+        elif self.depths and self.depths[0][0] > 0:
+            depth, nodes, _ = self.depths[0]
+            return nodes ** (1 / depth)
+        return 0.0
+
+    def to_dict(self) -> dict:
+        """Return a dict of every statistic, including the rates calculated from them."""
+        return {'move_number': self.move_number, 'endgame': self.endgame,
+                'ponder_hit': self.ponder_hit, 'nodes': self.nodes,
+                'leaf_evaluations': self.leaf_evaluations, 'tt_probes': self.tt_probes,
+                'tt_hits': self.tt_hits, 'book_hits': self.book_hits,
+                'tt_stores': self.tt_stores, 'cutoffs': self.cutoffs,
+                'first_move_cutoffs': self.first_move_cutoffs,
+                'depths': [list(depth) for depth in self.depths], 'seconds': self.seconds,
+                'tt_hit_rate': self.tt_hit_rate(),
+                'first_move_cutoff_rate': self.first_move_cutoff_rate(),
+                'branching_factor': self.branching_factor()}
+
+    def to_json(self) -> str:
+        """Return the dict from to_dict as one line of JSON."""
+        return json.dumps(self.to_dict())
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['json'],  # the names (strs) of imported modules
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
@@ -0,0 +1,220 @@
+"""CSC111 Final Project: Exploring Using Graph Based Data Structures to Implement a Connect 4 AI
+
+Module Description
+==================
+
+This module contains a headless simulator that plays large numbers of games of connect 4, for
+collecting statistics and self-play data. Unlike connect4.run_game and visualization.run_games,
+nothing is drawn and no game tree is built: each game is reduced to a short record of its moves
+and its winner, which is written to a file as soon as it is played.
+
+Games between two players that only make random moves are played thousands at a time on a
+board.BatchBoard, which is much faster than playing them one by one through Board. Games between
+any other players are played on a Board. The random games can also be split between several
+processes.
+
+Each game is saved as one line of the output file: the columns of its moves as a string of
+digits, a comma, and the winner (1 for red, -1 for yellow, and 0 for a tie). For example, the
+line '3344556,1' is a game where red won with its fourth move. read_games reads these files back.
+
+For example, this plays a million random games and saves them to games.txt:
+
+    python simulator.py --games 1000000 --output games.txt
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) 2021 Brian Cho and Luke Avveduto
+"""
+from typing import Iterator, Optional, TextIO
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import random
+import time
+import numpy as np
+from board import Board, BatchBoard, ROWS, COLUMNS
+from players import Player, AIPlayerComplex, AIPlayerNegamax
+
+# The number of games each process plays at a time, on one BatchBoard
+_BATCH_SIZE = 10000
+
+
+def simulate_games(n: int, red: Optional[Player] = None, yellow: Optional[Player] = None,
+                   output: Optional[str] = None, seed: Optional[int] = None,
+                   workers: int = 1) -> tuple[int, int, int]:
+    """Play n games of connect 4 between red and yellow, and return a tuple of the number of
+    games red won, the number yellow won and the number that were tied.
+
+    If red or yellow is None, that player makes uniformly random moves. When both of them are
+    None, the games are played on a BatchBoard instead of a Board, and can be split
+    between 'workers' processes. If output is given, the record of every game is written to it
+    as described in the module description. If seed is given, the random games are the same
+    every time, no matter how many workers play them.
+
+    Preconditions:
+        - n >= 0
+        - workers >= 1
+        - workers == 1 or (red is None and yellow is None)
+        - not (red is not None and red.is_human) and not (yellow is not None and yellow.is_human)
+    """
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    batches = [min(_BATCH_SIZE, n - start) for start in range(0, n, _BATCH_SIZE)]
+    seeds = [seed + i for i in range(len(batches))]
+
+    start = time.perf_counter()
+    if red is None and yellow is None:
+        if workers > 1:
+            with ProcessPoolExecutor(workers) as pool:
+                results = _write_games(pool.map(_play_random_games, batches, seeds), output)
+        else:
+            results = _write_games(map(_play_random_games, batches, seeds), output)
+    else:
+        rng = random.Random(seed)
+        results = _write_games(([_play_game(red, yellow, rng)] for _ in range(n)), output)
+
+    elapsed = time.perf_counter() - start
+    print(f'Played {n} games in {elapsed:.1f} seconds ({n / max(elapsed, 1e-9):.0f} per second)')
+    return results
+
+
+def read_games(file: str) -> Iterator[tuple[list[int], int]]:
+    """Return an iterator over the move list and winner of every game saved in 'file' by
+    simulate_games. The file is read one game at a time.
+
+    Preconditions:
+        - 'file' must be a path to a file created by simulate_games
+    """
+    with open(file) as games:
+        for line in games:
+            moves, winner = line.rstrip('\n').split(',')
+            yield [int(move) for move in moves], int(winner)
+
+
+def _write_games(batches: Iterator[list[tuple[str, int]]],
+                 output: Optional[str]) -> tuple[int, int, int]:
+    """Write every game in 'batches' to the file 'output', or to no file if it is None, and
+    return the number of red wins, yellow wins and ties among them. Each batch is written as
+    soon as it is played.
+    """
+    if output is None:
+        return _count_wins(batches, None)
+    with open(output, 'w') as games:
+        return _count_wins(batches, games)
+
+
+def _count_wins(batches: Iterator[list[tuple[str, int]]],
+                games: Optional[TextIO]) -> tuple[int, int, int]:
+    """Return the number of red wins, yellow wins and ties among the games in 'batches', writing
+    each batch to the open file 'games' as it is counted, unless games is None.
+    """
+    wins = {1: 0, -1: 0, 0: 0}
+    for batch in batches:
+        for _, winner in batch:
+            wins[winner] += 1
+        if games is not None:
+            games.writelines(f'{moves},{winner}\n' for moves, winner in batch)
+    return wins[1], wins[-1], wins[0]
+
+
+def _play_game(red: Optional[Player], yellow: Optional[Player],
+               rng: random.Random) -> tuple[str, int]:
+    """Return the moves and winner of a game between red and yellow played on a Board. A player
+    that is None makes random moves chosen with rng.
+    """
+    board = Board()
+    players = (red, yellow)
+    moves = []
+    while board.get_winner() is None:
+        player = players[board.move_number % 2]
+        if player is None:
+            move = rng.choice(board.get_valid_moves())
+        else:
+            move = player.make_move(board)
+        board.make_move(move)
+        moves.append(str(move))
+    return ''.join(moves), board.get_winner()
+
+
+def _play_random_games(n: int, seed: int) -> list[tuple[str, int]]:
+    """Return the moves and winner of n games where both players make uniformly random moves,
+    chosen by a numpy random number generator seeded with 'seed'.
+
+    The games are all played at once on a BatchBoard. The move made on every board at each ply is
+    kept in 'plies', and a game's record is the moves made on its board before it finished.
+    """
+    rng = np.random.default_rng(seed)
+    boards = BatchBoard(n)
+    plies = np.zeros((ROWS * COLUMNS, n), dtype=np.uint8)
+    lengths = np.zeros(n, dtype=np.intp)
+    while not np.all(boards.finished):
+        moves = boards.get_random_moves(rng)
+        plies[boards.move_number] = moves
+        lengths += ~boards.finished
+        boards.make_moves(moves)
+
+    # Each game's moves as a row of ascii digits, so that its record is a slice of one string
+    digits = (plies.T + ord('0')).tobytes().decode()
+    width = ROWS * COLUMNS
+    return [(digits[i * width:i * width + lengths[i]], int(boards.winners[i])) for i in range(n)]
+
+
+def _make_player(name: str, depth: int) -> Optional[Player]:
+    """Return a new player of the kind called 'name' on the command line, searching to a depth of
+    'depth' if it is an AI, or None for a player that makes random moves.
+
+    Preconditions:
+        - name in {'random', 'complex', 'negamax'}
+    """
+    if name == 'complex':
+        return AIPlayerComplex(depth)
+    elif name == 'negamax':
+        return AIPlayerNegamax(depth)
+    return None
+
+
+def main(args: Optional[list[str]] = None) -> None:
+    """Run the simulator with the command line arguments 'args', or the ones the program was run
+    with if args is None. Run with --help for a description of them.
+    """
+    parser = argparse.ArgumentParser(description='Play many games of connect 4 without a GUI.')
+    parser.add_argument('--games', type=int, required=True, help='the number of games to play')
+    parser.add_argument('--output', default=None, help='the file to save the games to')
+    parser.add_argument('--red', choices=['random', 'complex', 'negamax'], default='random',
+                        help='the red player (default: random)')
+    parser.add_argument('--yellow', choices=['random', 'complex', 'negamax'], default='random',
+                        help='the yellow player (default: random)')
+    parser.add_argument('--depth', type=int, default=4, help='the depth of the AI players')
+    parser.add_argument('--seed', type=int, default=None, help='the seed for the random moves')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='the number of processes to play random games with')
+
+    arguments = parser.parse_args(args)
+    red = _make_player(arguments.red, arguments.depth)
+    yellow = _make_player(arguments.yellow, arguments.depth)
+    workers = arguments.workers if red is None and yellow is None else 1
+    red_wins, yellow_wins, ties = simulate_games(arguments.games, red, yellow, arguments.output,
+                                                 arguments.seed, workers)
+    print(f'Red wins: {red_wins}, yellow wins: {yellow_wins}, ties: {ties}')
+
+
+if __name__ == '__main__':
+    import sys
+    # The doctests and python_ta are only run with --self-check, and any other arguments are
+    # passed to main, so that running the tool with no arguments still runs the tool
+    if sys.argv[1:] == ['--self-check']:
+        import doctest
+        doctest.testmod()
+
+        import python_ta
+        python_ta.check_all(config={
+            'extra-imports': ['typing', 'concurrent.futures', 'argparse', 'random', 'time', 'numpy',
+                              'board', 'players'],
+            # the names (strs) of imported modules
+            'allowed-io': ['simulate_games', 'read_games', '_write_games', 'main'],
+            # the names (strs) of functions that call print/open/input
+            'max-line-length': 100,
+            'disable': ['E1136']
+        })
+    else:
+        main()
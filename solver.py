@@ -0,0 +1,213 @@
+"""CSC111 Final Project: Exploring Using Graph Based Data Structures to Implement a Connect 4 AI
+
+Module Description
+==================
+
+This module contains the EndgameSolver class, which finds the exact result of a game of connect 4
+from a given board, assuming both players play perfectly. Searching every possible game is far
+too slow near the start of the game, but once the board is mostly full there are few enough
+games left that it can be done in a reasonable amount of time. AIPlayerComplex uses this to play
+perfectly at the end of the game, instead of relying on its heuristic evaluation.
+
+The solver gives each board a score from the point of view of the player whose turn it is:
+    - 0 if the game will be a draw
+    - a positive number if the player will win, which is larger the sooner they win. A win with
+      the player's own last piece is worth 1, and a win with their second last piece is worth 2,
+      and so on.
+    - a negative number if the player will lose, which is more negative the sooner they lose.
+
+The solver is based on the one described here: http://blog.gamesolver.org/
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) 2021 Brian Cho and Luke Avveduto
+"""
+from board import Board, ROWS, COLUMNS
+from transposition_table import TranspositionTable, LOWER, UPPER
+
+
+class EndgameSolver:
+    """A class that finds the exact score of a board and the best move on it by searching every
+    possible game from that board, using negamax with alpha-beta pruning and a transposition
+    table.
+
+    Only moves that do not let the other player win straight away are searched, and they are
+    searched in order of how many new ways to win they give the player that makes them. Instead of
+    searching with a window of every possible score, the score is found by a binary search that
+    only ever asks whether the score is above some value, as these searches prune far more of
+    the tree.
+    """
+    # Private Instance Attributes:
+    #   - _transposition_table: this is a table that maps the canonical hash of a board (see
+    #     Board.get_canonical_hash) to a bound on its score, whether that is a lower bound or an
+    #     upper bound, and the best move found for the board the canonical hash came from. The
+    #     scores never depend on how deep the search was, so they stay correct for the rest of
+    #     the game.
+    _transposition_table: TranspositionTable
+
+    def __init__(self, table_size_mb: float = 16) -> None:
+        """Creates a new instance of EndgameSolver with an empty transposition table that uses
+        at most table_size_mb megabytes of memory.
+
+        Preconditions:
+            - table_size_mb >= 1
+        """
+        self._transposition_table = TranspositionTable(table_size_mb)
+
+    def solve(self, board: Board) -> int:
+        """Return the score of 'board' for the player whose turn it is, with perfect play from
+        both players. See the module description for what the score means.
+
+        board is left in the same state it was in when this function was called.
+
+        Preconditions:
+            - board.get_winner() is None
+        """
+        if board.get_winning_moves():
+            return (ROWS * COLUMNS + 1 - board.move_number) // 2
+
+        # The lowest and highest scores the board could possibly have
+        low = -((ROWS * COLUMNS - board.move_number) // 2)
+        high = (ROWS * COLUMNS + 1 - board.move_number) // 2
+        while low < high:
+            # Searches near 0 are the fastest, so the guess is moved towards 0 when possible
+            guess = low + (high - low) // 2
+            if guess <= 0 and low // 2 < guess:
+                guess = low // 2
+            elif guess >= 0 and high // 2 > guess:
+                guess = high // 2
+
+            # Only finds out whether the score is above guess or not
+            score = self._negamax(board, guess, guess + 1)
+            if score <= guess:
+                high = score
+            else:
+                low = score
+
+        return low
+
+    def best_move(self, board: Board) -> (int, int):
+        """Return a tuple of the best move on 'board' for the player whose turn it is and the
+        score of the board for that player. When several moves are equally good, the first one
+        in the order given by board.get_valid_moves() is returned.
+
+        board is left in the same state it was in when this function was called.
+
+        Preconditions:
+            - board.get_winner() is None
+        """
+        winning_moves = board.get_winning_moves()
+        if winning_moves:
+            return winning_moves[0], (ROWS * COLUMNS + 1 - board.move_number) // 2
+
+        score = self.solve(board)
+        non_losing_moves = board.get_non_losing_moves()
+        if not non_losing_moves:
+            return board.get_valid_moves()[0], score
+
+        # The score of the board is already known, so each move only needs to be checked for
+        # whether it reaches that score, which is much faster than finding its exact score
+        for move in non_losing_moves:
+            board.make_move(move)
+            move_score = -self._negamax(board, -score, -score + 1)
+            board.un_move(move)
+            if move_score >= score:
+                return move, score
+
+        return non_losing_moves[0], score
+
+    def _negamax(self, board: Board, alpha: int, beta: int) -> int:
+        """Return the score of 'board' for the player whose turn it is. If the score is at most
+        alpha, the value returned is only an upper bound on it, and if it is at least beta, the
+        value returned is only a lower bound on it.
+
+        Preconditions:
+            - alpha < beta
+            - board.get_winning_moves() == []
+        """
+        moves = board.get_non_losing_moves()
+        if not moves:
+            # Whatever is played, the other player wins on their next move
+            return -((ROWS * COLUMNS - board.move_number) // 2)
+        if board.move_number >= ROWS * COLUMNS - 2:
+            return 0  # Neither of the last two pieces can win, so it is a draw
+
+        # The other player can not win on their next move, so the score can not be lower than
+        # this. The player whose turn it is can not win with this move either, so the score can
+        # not be higher than this
+        lowest = -((ROWS * COLUMNS - 2 - board.move_number) // 2)
+        highest = (ROWS * COLUMNS - 1 - board.move_number) // 2
+
+        key, mirrored = board.get_canonical_hash()
+        hash_move = None
+        entry = self._transposition_table.probe(key)
+        if entry is not None:
+            value, flag, _, hash_move = entry
+            if mirrored and hash_move is not None:
+                hash_move = COLUMNS - 1 - hash_move
+            if flag == UPPER:
+                highest = min(highest, value)
+            elif flag == LOWER:
+                lowest = max(lowest, value)
+
+        alpha = max(alpha, lowest)
+        beta = min(beta, highest)
+        if alpha >= beta:
+            return alpha
+
+        color = board.get_active_player()
+        empty = ROWS * COLUMNS - board.move_number
+        for move in self._order_moves(board, moves, color, hash_move):
+            board.make_move(move)
+            score = -self._negamax(board, -beta, -alpha)
+            board.un_move(move)
+
+            if score >= beta:
+                if mirrored:
+                    move = COLUMNS - 1 - move
+                self._transposition_table.store(key, score, LOWER, empty, move)
+                return score
+            alpha = max(alpha, score)
+
+        self._transposition_table.store(key, alpha, UPPER, empty)
+        return alpha
+
+    def _order_moves(self, board: Board, moves: list[int], color: int,
+                     hash_move: int) -> list[int]:
+        """Return a new list of 'moves' in the order they should be searched in. The hash move
+        goes first, and the rest are ordered by the number of ways to win the player with the
+        colour 'color' has after making the move. Moves that give the same number of ways to win
+        stay in the same order.
+
+        Preconditions:
+            - color == board.get_active_player()
+            - all({move in board.get_valid_moves() for move in moves})
+        """
+        if len(moves) == 1:
+            return moves
+
+        threats = {}
+        for move in moves:
+            board.make_move(move)
+            threats[move] = board.get_threat_count(color)
+            board.un_move(move)
+
+        ordered = sorted(moves, key=threats.__getitem__, reverse=True)
+        if hash_move is not None and hash_move in threats:
+            ordered.remove(hash_move)
+            ordered.insert(0, hash_move)
+        return ordered
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['board', 'transposition_table'],  # the names (strs) of imported modules
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
@@ -0,0 +1,325 @@
+"""CSC111 Final Project: Exploring Using Graph Based Data Structures to Implement a Connect 4 AI
+
+Module Description
+==================
+
+This module contains a tournament runner, which measures how strong the AI players are compared
+to each other. Every player plays every other player the same number of times, split between a
+pool of processes. Red has a big advantage in connect 4, so the games are played in pairs: both
+games of a pair start from the same few random moves (the 'opening'), with each player playing
+red in one of them. The random openings also stop players that always make the same moves from
+playing the exact same game over and over again.
+
+The results are given as Elo ratings, which are found by maximum likelihood: the ratings that
+make the results of the games the most likely, if a player rated d points higher than another
+scores 1 / (1 + 10 ** (-d / 400)) against them on average. A win counts as 1 point, a draw as
+0.5 and a loss as 0. So that a player that wins or loses every game does not get an infinite
+rating, every pair of players that played is also given one extra drawn game. The ratings are
+shifted so that their average is 0, and each one is given with a 95% confidence interval.
+
+The time each player took for each move is also recorded, so that changes that make the AI
+faster can be checked to not also make it weaker, and the other way around.
+
+For example, this plays 10 pairs of games between every two of a random player, AIPlayerComplex
+at depths 4 and 6, and AIPlayerMCTS with 1000 playouts a move:
+
+    python tournament.py --rounds 10 --players random complex:4 complex:6 mcts:1000
+
+More information on Elo ratings can be found here: https://en.wikipedia.org/wiki/Elo_rating_system
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) 2021 Brian Cho and Luke Avveduto
+"""
+from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import itertools
+import math
+import random
+import time
+from board import Board
+from players import RandomPlayer, AIPlayerComplex, AIPlayerNegamax, AIPlayerMCTS
+
+# The number of times the Elo ratings are improved when finding them, and the number of standard
+# errors on either side of a rating that its 95% confidence interval covers
+_ELO_ITERATIONS = 1000
+_CONFIDENCE_Z = 1.96
+
+# The kinds of players that can be given on the command line, and the name of the argument the
+# number after the colon is passed as
+_PLAYER_KINDS = {'random': (RandomPlayer, None), 'complex': (AIPlayerComplex, 'depth'),
+                 'negamax': (AIPlayerNegamax, 'depth'), 'mcts': (AIPlayerMCTS, 'iterations')}
+
+
+class GameResult:
+    """The result of one game of a tournament.
+
+    Representation Invariants:
+        - self.winner in {-1, 0, 1}
+        - len(self.red_times) + len(self.yellow_times) + self.opening_plies == len(self.moves)
+    """
+    # Public Instance Attributes:
+    #   - red: the name of the player that played red
+    #   - yellow: the name of the player that played yellow
+    #   - winner: 1 if red won, -1 if yellow won and 0 if it was a draw
+    #   - moves: every move of the game, including the opening
+    #   - opening_plies: the number of random moves the game started with
+    #   - red_times: the number of seconds red took for each of its moves
+    #   - yellow_times: the number of seconds yellow took for each of its moves
+    red: str
+    yellow: str
+    winner: int
+    moves: list[int]
+    opening_plies: int
+    red_times: list[float]
+    yellow_times: list[float]
+
+    def __init__(self, red: str, yellow: str, winner: int, moves: list[int], opening_plies: int,
+                 red_times: list[float], yellow_times: list[float]) -> None:
+        """Initialize a new GameResult with the given attributes."""
+        self.red = red
+        self.yellow = yellow
+        self.winner = winner
+        self.moves = moves
+        self.opening_plies = opening_plies
+        self.red_times = red_times
+        self.yellow_times = yellow_times
+
+
+def run_tournament(players: dict[str, tuple[type, dict]], rounds: int, opening_plies: int = 2,
+                   workers: Optional[int] = None, seed: Optional[int] = None) -> list[GameResult]:
+    """Play a round robin tournament between 'players' and return the results of every game.
+
+    players maps the name of each player to its class and a dict of the arguments to create it
+    with, for example {'complex 6': (AIPlayerComplex, {'depth': 6})}. A new player is created for
+    every game, so that nothing a player remembers from one game can affect another one.
+
+    In each round, every two players play a pair of games from a new random opening of
+    opening_plies moves, one with each of them playing red. The games are split between
+    'workers' processes, or one per core if workers is None. If seed is given, the openings are
+    the same every time.
+
+    Preconditions:
+        - len(players) >= 2
+        - none of the players are human
+        - rounds >= 1
+        - 0 <= opening_plies <= 6
+        - workers is None or workers >= 1
+    """
+    rng = random.Random(seed)
+    games = []
+    for _ in range(rounds):
+        for first, second in itertools.combinations(players, 2):
+            opening = _random_opening(opening_plies, rng)
+            games.append((first, players[first], second, players[second], opening))
+            games.append((second, players[second], first, players[first], opening))
+
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(workers) as pool:
+        for result in pool.map(_play_game, games):
+            results.append(result)
+            if len(results) % 100 == 0 or len(results) == len(games):
+                print(f'{len(results)}/{len(games)} games played '
+                      f'({time.perf_counter() - start:.0f} seconds)')
+    return results
+
+
+def compute_elo(results: list[GameResult]) -> dict[str, tuple[float, float]]:
+    """Return a dict that maps the name of every player in results to a tuple of their Elo
+    rating and the distance from it to either end of its 95% confidence interval, as described
+    in the module description.
+
+    >>> wins = [GameResult('a', 'b', 1, [], 0, [], []), GameResult('b', 'a', -1, [], 0, [], [])]
+    >>> ratings = compute_elo(wins + [GameResult('a', 'b', 0, [], 0, [], [])])
+    >>> round(ratings['a'][0]), round(ratings['b'][0])
+    (95, -95)
+
+    Preconditions:
+        - results != []
+    """
+    # The number of games between each pair of players, and each player's total score
+    games = {}
+    scores = {}
+    for result in results:
+        pair = (min(result.red, result.yellow), max(result.red, result.yellow))
+        games[pair] = games.get(pair, 0) + 1
+        scores[result.red] = scores.get(result.red, 0) + (1 + result.winner) / 2
+        scores[result.yellow] = scores.get(result.yellow, 0) + (1 - result.winner) / 2
+
+    # The extra drawn game between every pair of players
+    for first, second in games:
+        games[(first, second)] += 1
+        scores[first] += 0.5
+        scores[second] += 0.5
+    names = sorted(scores)
+    opponents = {name: [(pair[0] if pair[1] == name else pair[1], count)
+                        for pair, count in games.items() if name in pair] for name in names}
+
+    # Each player's strength is 10 ** (rating / 400). These are updated with the
+    # minorization-maximization algorithm for the Bradley-Terry model, which always gets closer to
+    # the most likely strengths: https://doi.org/10.1214/aos/1079120141
+    strengths = {name: 1.0 for name in names}
+    for _ in range(_ELO_ITERATIONS):
+        strengths = {name: scores[name] / sum(count / (strengths[name] + strengths[opponent])
+                                              for opponent, count in opponents[name])
+                     for name in names}
+        mean_log = sum(math.log(strength) for strength in strengths.values()) / len(names)
+        strengths = {name: strengths[name] / math.exp(mean_log) for name in names}
+
+    # The standard error of each rating comes from how much the likelihood changes when only
+    # that rating changes
+    ratings = {}
+    for name in names:
+        information = 0
+        for opponent, count in opponents[name]:
+            expected = strengths[name] / (strengths[name] + strengths[opponent])
+            information += count * expected * (1 - expected)
+        error = 400 / math.log(10) / math.sqrt(information)
+        ratings[name] = (400 * math.log10(strengths[name]), _CONFIDENCE_Z * error)
+    return ratings
+
+
+def summarise_move_times(results: list[GameResult]) -> dict[str, tuple[int, float, float]]:
+    """Return a dict that maps the name of every player in results to a tuple of the number of
+    moves they made, the average time they took for a move in milliseconds, and the longest time
+    they took for a move in milliseconds. The moves of the openings are not included.
+    """
+    times = {}
+    for result in results:
+        times.setdefault(result.red, []).extend(result.red_times)
+        times.setdefault(result.yellow, []).extend(result.yellow_times)
+    return {name: (len(player_times), 1000 * sum(player_times) / max(len(player_times), 1),
+                   1000 * max(player_times, default=0))
+            for name, player_times in times.items()}
+
+
+def print_report(results: list[GameResult]) -> None:
+    """Print a table of every player in results, from the highest Elo rating to the lowest,
+    with their score, rating and move times.
+    """
+    ratings = compute_elo(results)
+    move_times = summarise_move_times(results)
+    played = {}
+    scores = {}
+    for result in results:
+        for name, score in ((result.red, (1 + result.winner) / 2),
+                            (result.yellow, (1 - result.winner) / 2)):
+            played[name] = played.get(name, 0) + 1
+            scores[name] = scores.get(name, 0) + score
+
+    width = max(len(name) for name in ratings)
+    print(f'{"Player":<{width}}  Games  Score    Elo         Moves  Mean ms  Max ms')
+    for name in sorted(ratings, key=lambda n: ratings[n][0], reverse=True):
+        rating, error = ratings[name]
+        moves, mean_ms, max_ms = move_times[name]
+        print(f'{name:<{width}}  {played[name]:5}  {100 * scores[name] / played[name]:5.1f}%  '
+              f'{rating:5.0f} ± {error:3.0f}  {moves:6}  {mean_ms:7.1f}  {max_ms:6.0f}')
+
+
+def _random_opening(plies: int, rng: random.Random) -> list[int]:
+    """Return a list of 'plies' random moves from the start of the game, chosen with rng.
+
+    Preconditions:
+        - 0 <= plies <= 6
+    """
+    board = Board(incremental_eval=False)
+    moves = []
+    for _ in range(plies):
+        move = rng.choice(board.get_valid_moves())
+        board.make_move(move)
+        moves.append(move)
+    return moves
+
+
+def _play_game(game: tuple[str, tuple[type, dict], str, tuple[type, dict], list[int]]) \
+        -> GameResult:
+    """Play the game described by 'game', a tuple of the name and configuration of the red
+    player, the name and configuration of the yellow player, and the opening, as described in
+    run_tournament. Return its result.
+    """
+    red_name, (red_class, red_arguments), yellow_name, (yellow_class, yellow_arguments), \
+        opening = game
+    players = (red_class(**red_arguments), yellow_class(**yellow_arguments))
+    times = ([], [])
+
+    board = Board()
+    moves = list(opening)
+    for move in opening:
+        board.make_move(move)
+    while board.get_winner() is None:
+        turn = board.move_number % 2
+        start = time.perf_counter()
+        move = players[turn].make_move(board)
+        times[turn].append(time.perf_counter() - start)
+        board.make_move(move)
+        moves.append(move)
+
+    return GameResult(red_name, yellow_name, board.get_winner(), moves, len(opening), times[0],
+                      times[1])
+
+
+def _parse_player(description: str) -> tuple[str, tuple[type, dict]]:
+    """Return the name and configuration of the player described by 'description' on the
+    command line. This is the kind of player, followed by a colon and its depth or number of
+    playouts for players that have one, for example 'complex:6' or 'mcts:1000'.
+
+    >>> _parse_player('complex:6')
+    ('complex:6', (<class 'players.AIPlayerComplex'>, {'depth': 6}))
+
+    Preconditions:
+        - description.split(':')[0] in _PLAYER_KINDS
+    """
+    kind, _, value = description.partition(':')
+    player_class, argument = _PLAYER_KINDS[kind]
+    if argument is None or value == '':
+        return description, (player_class, {})
+    return description, (player_class, {argument: int(value)})
+
+
+def main(args: Optional[list[str]] = None) -> None:
+    """Run a tournament with the command line arguments 'args', or the ones the program was run
+    with if args is None. Run with --help for a description of them.
+    """
+    parser = argparse.ArgumentParser(description='Play a round robin tournament between AI '
+                                                 'players and report their Elo ratings.')
+    parser.add_argument('--players', nargs='+', required=True,
+                        help='the players, each one of ' + ', '.join(_PLAYER_KINDS)
+                             + ' followed by :depth or :playouts, for example complex:6')
+    parser.add_argument('--rounds', type=int, default=10,
+                        help='the number of pairs of games between every two players')
+    parser.add_argument('--opening-plies', type=int, default=2,
+                        help='the number of random moves each game starts with')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='the number of processes to play games with (default: one per core)')
+    parser.add_argument('--seed', type=int, default=None, help='the seed for the openings')
+
+    arguments = parser.parse_args(args)
+    players = dict(_parse_player(description) for description in arguments.players)
+    results = run_tournament(players, arguments.rounds, arguments.opening_plies,
+                             arguments.workers, arguments.seed)
+    print_report(results)
+
+
+if __name__ == '__main__':
+    import sys
+    # The doctests and python_ta are only run with --self-check, and any other arguments are
+    # passed to main, so that running the tool with no arguments still runs the tool
+    if sys.argv[1:] == ['--self-check']:
+        import doctest
+        doctest.testmod()
+
+        import python_ta
+        python_ta.check_all(config={
+            'extra-imports': ['typing', 'concurrent.futures', 'argparse', 'itertools', 'math',
+                              'random', 'time', 'board', 'players'],
+            # the names (strs) of imported modules
+            'allowed-io': ['run_tournament', 'print_report'],
+            # the names (strs) of functions that call print/open/input
+            'max-line-length': 100,
+            'disable': ['E1136']
+        })
+    else:
+        main()
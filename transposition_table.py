@@ -0,0 +1,261 @@
+"""CSC111 Final Project: Exploring Using Graph Based Data Structures to Implement a Connect 4 AI
+
+Module Description
+==================
+
+This module contains the TranspositionTable class, which the AI players use to remember the
+evaluations of boards they have already searched. A transposition table maps the hash of a board
+(see board.py and opening_book_gen.py) to what the search found out about it: its evaluation,
+whether that evaluation is exact or only a bound, the depth it was searched to, and the best move.
+
+Unlike a dict, the table has a fixed size that is chosen when it is created, so it never uses more
+memory than it is allowed to no matter how many games are played. The entries are stored in two
+flat arrays of 64 bit ints, and each hash can only go in one 'bucket' of two entries: the first
+one keeps whichever board was searched the deepest, and the second one is always replaced by the
+newest board. This means that when the table is full, the entries that were the most work to
+calculate are the ones that are kept.
+
+A table can also be created in shared memory, so that several processes searching at the same
+time can all use the same entries. Each process attaches to the table using its name. There are
+no locks: instead, the key array holds the hash of each board xor-ed with its packed entry, so an
+entry that was half written by one process while another one read it will not match any hash,
+and is simply treated as missing. More information on this can be found here:
+https://www.chessprogramming.org/Shared_Hash_Table#Lock-less
+
+More information on transposition tables can be found here:
+https://www.chessprogramming.org/Transposition_Table
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) 2021 Brian Cho and Luke Avveduto
+"""
+from typing import Iterator, Optional
+from multiprocessing import shared_memory
+import math
+import weakref
+
+# The possible flags of an entry: the value is exact, the value is a lower bound on the real
+# evaluation, or the value is an upper bound on the real evaluation. 0 is used to mark empty
+# entries. FLAG_NAMES maps them to the strings used in the opening books.
+EXACT = 1
+LOWER = 2
+UPPER = 3
+FLAG_NAMES = {EXACT: 'exact', LOWER: 'low', UPPER: 'high'}
+FLAGS = {name: flag for flag, name in FLAG_NAMES.items()}
+
+# Each entry stores its flag, best move, depth, generation and value packed into one int, using
+# the number of bits given below. The value is stored with _VALUE_OFFSET added to it, so that it
+# is never negative
+_FLAG_BITS = 2
+_MOVE_BITS = 3
+_DEPTH_BITS = 7
+_GENERATION_BITS = 8
+_MOVE_SHIFT = _FLAG_BITS
+_DEPTH_SHIFT = _MOVE_SHIFT + _MOVE_BITS
+_GENERATION_SHIFT = _DEPTH_SHIFT + _DEPTH_BITS
+_VALUE_SHIFT = _GENERATION_SHIFT + _GENERATION_BITS
+_VALUE_OFFSET = 1 << 32
+_NO_MOVE = (1 << _MOVE_BITS) - 1
+
+# The number of bytes used by each bucket: two entries of two 64 bit ints each. The table also
+# has a header of _HEADER_BYTES at the start, which holds the current generation
+_BUCKET_BYTES = 2 * 2 * 8
+_HEADER_BYTES = 8
+
+
+class TranspositionTable:
+    """A fixed size table that maps the hashes of boards to what a search found out about them.
+
+    Representation Invariants:
+        - self._bucket_mask + 1 is a power of 2
+        - len(self._keys) == len(self._entries) == 2 * (self._bucket_mask + 1)
+        - 0 <= self._generation[0] < 2 ** _GENERATION_BITS
+    """
+    # Public Instance Attributes:
+    #   - name: this is the name of the shared memory the table is stored in, which other
+    #     processes can pass to the constructor to use the same table. It is None if the table is
+    #     not shared.
+    #
+    # Private Instance Attributes:
+    #   - _memory: this is the memory all of the table is stored in.
+    #   - _keys: this is an array of the hash of the board stored in each entry, xor-ed with the
+    #     packed entry. The two entries of bucket i are at indices 2 * i and 2 * i + 1.
+    #   - _entries: this is an array of the packed value, flag, depth, best move and generation
+    #     of each entry. An entry is empty if this is 0.
+    #   - _bucket_mask: this is the number of buckets minus one. As the number of buckets is a
+    #     power of two, hash & _bucket_mask is the bucket a hash belongs in.
+    #   - _generation: this is an array whose only item is a number that is increased by
+    #     new_search. Entries stored in an older generation can always be replaced, so old games do
+    #     not fill up the table forever. It is kept in the table's memory, so that every process
+    #     using a shared table agrees on it.
+    name: Optional[str]
+    _memory: memoryview
+    _keys: memoryview
+    _entries: memoryview
+    _bucket_mask: int
+    _generation: memoryview
+
+    def __init__(self, size_mb: float = 16, shared: bool = False,
+                 name: Optional[str] = None) -> None:
+        """Creates a new empty transposition table that uses at most size_mb megabytes of memory.
+        The number of buckets is the largest power of two that fits in that much memory.
+
+        If shared is True, the table is created in shared memory, which other processes can use
+        by creating a TranspositionTable with the same size_mb and name=self.name. The shared
+        memory is freed once the table that created it is garbage collected.
+
+        Preconditions:
+            - size_mb * 2 ** 20 >= _BUCKET_BYTES
+            - not (shared and name is not None)
+            - name is None or it is the name of a table with the same size_mb that still exists
+        """
+        buckets = 1
+        while buckets * 2 * _BUCKET_BYTES <= size_mb * 2 ** 20:
+            buckets *= 2
+        self._bucket_mask = buckets - 1
+        size = _HEADER_BYTES + buckets * _BUCKET_BYTES
+
+        if shared or name is not None:
+            block = shared_memory.SharedMemory(name, create=shared, size=size)
+            self.name = block.name
+            self._memory = block.buf[:size]
+        else:
+            block = None
+            self.name = None
+            self._memory = memoryview(bytearray(size))
+
+        entries_start = _HEADER_BYTES + buckets * _BUCKET_BYTES // 2
+        self._generation = self._memory[:_HEADER_BYTES].cast('q')
+        self._keys = self._memory[_HEADER_BYTES:entries_start].cast('Q')
+        self._entries = self._memory[entries_start:].cast('q')
+
+        if block is not None:
+            views = [self._generation, self._keys, self._entries, self._memory]
+            weakref.finalize(self, _close_shared_memory, block, views, shared)
+
+    def __len__(self) -> int:
+        """Return the number of entries that are currently stored in the table."""
+        return len(self._entries) - self._entries.tolist().count(0)
+
+    def capacity(self) -> int:
+        """Return the largest number of entries the table can hold."""
+        return len(self._entries)
+
+    def new_search(self) -> None:
+        """Start a new generation of entries. The entries stored before this is called are still
+        used, but can be replaced by any new entry, even one that was searched less deeply.
+        """
+        self._generation[0] = (self._generation[0] + 1) % (1 << _GENERATION_BITS)
+
+    def clear(self) -> None:
+        """Remove every entry from the table."""
+        self._memory[:] = bytes(len(self._memory))
+
+    def probe(self, key: int) -> Optional[tuple[int, int, int, Optional[int]]]:
+        """Return a tuple of the value, flag, depth and best move stored for the board with hash
+        'key', or None if the board is not in the table. The best move is None if none was stored.
+        """
+        index = (key & self._bucket_mask) << 1
+        entry = self._entries[index]
+        if entry and self._keys[index] ^ entry == key:
+            return _unpack(entry)
+        entry = self._entries[index + 1]
+        if entry and self._keys[index + 1] ^ entry == key:
+            return _unpack(entry)
+        return None
+
+    def store(self, key: int, value: int, flag: int, depth: int,
+              move: Optional[int] = None) -> None:
+        """Store an entry for the board with hash 'key'.
+
+        The entry goes in the first slot of its bucket if that slot is empty, already holds this
+        board, was searched less deeply than this entry, or is from an older generation.
+        Otherwise it goes in the second slot, replacing whatever was there.
+
+        Preconditions:
+            - flag in {EXACT, LOWER, UPPER}
+            - 0 <= depth < 2 ** _DEPTH_BITS
+            - move is None or 0 <= move <= 6
+            - -_VALUE_OFFSET <= value < _VALUE_OFFSET
+        """
+        if move is None:
+            move = _NO_MOVE
+        generation = self._generation[0]
+        packed = ((value + _VALUE_OFFSET) << _VALUE_SHIFT | generation << _GENERATION_SHIFT
+                  | depth << _DEPTH_SHIFT | move << _MOVE_SHIFT | flag)
+
+        index = (key & self._bucket_mask) << 1
+        current = self._entries[index]
+        if current == 0 or self._keys[index] ^ current == key \
+                or depth >= (current >> _DEPTH_SHIFT) & ((1 << _DEPTH_BITS) - 1) \
+                or (current >> _GENERATION_SHIFT) & ((1 << _GENERATION_BITS) - 1) != generation:
+            self._keys[index] = key ^ packed
+            self._entries[index] = packed
+        else:
+            self._keys[index + 1] = key ^ packed
+            self._entries[index + 1] = packed
+
+    def items(self) -> Iterator[tuple[int, tuple[int, int, int, Optional[int]]]]:
+        """Return an iterator over the hash and (value, flag, depth, best move) tuple of every
+        entry in the table.
+        """
+        for i in range(len(self._entries)):
+            entry = self._entries[i]
+            if entry:
+                yield self._keys[i] ^ entry, _unpack(entry)
+
+    def load(self, opening_book: dict[int, tuple[int, str, int]]) -> None:
+        """Store every entry of an opening book loaded by opening_book_gen.load_opening_book.
+        Entries with an infinite value do not say anything about the board, so they are skipped.
+
+        Preconditions:
+            - all({opening_book[key][1] in FLAGS for key in opening_book})
+        """
+        for key, (value, flag, depth) in opening_book.items():
+            if not math.isinf(value):
+                self.store(key, value, FLAGS[flag], depth)
+
+    def to_opening_book(self) -> dict[int, tuple[int, str, int]]:
+        """Return a dict of every entry in the table in the format used by
+        opening_book_gen.save_opening_book.
+        """
+        return {key: (value, FLAG_NAMES[flag], depth)
+                for key, (value, flag, depth, _) in self.items()}
+
+
+def _unpack(packed: int) -> tuple[int, int, int, Optional[int]]:
+    """Return a tuple of the value, flag, depth and best move packed into 'packed' by
+    TranspositionTable.store.
+    """
+    move = (packed >> _MOVE_SHIFT) & _NO_MOVE
+    return ((packed >> _VALUE_SHIFT) - _VALUE_OFFSET,
+            packed & ((1 << _FLAG_BITS) - 1),
+            (packed >> _DEPTH_SHIFT) & ((1 << _DEPTH_BITS) - 1),
+            None if move == _NO_MOVE else move)
+
+
+def _close_shared_memory(block: shared_memory.SharedMemory, views: list[memoryview],
+                         unlink: bool) -> None:
+    """Close the shared memory 'block' that a table was stored in, once the table is no longer
+    used. Every view into the block has to be released before it can be closed. If unlink is True,
+    the block is also freed, so it can no longer be used by any process.
+    """
+    for view in views:
+        view.release()
+    block.close()
+    if unlink:
+        block.unlink()
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['typing', 'multiprocessing', 'math', 'weakref'],  # the names (strs) of imported modules
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
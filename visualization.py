@@ -16,25 +16,38 @@ Copyright and Usage Information
 This file is Copyright (c) 2021 Brian Cho and Luke Avveduto
 """
 import tkinter
-import time
+import threading
 from typing import Optional
 import numpy as np
 import networkx as nx
 import matplotlib.pyplot as plt
+from board import Board
 from connect4 import Connect4Game
 from connect4 import run_game
-from players import Player
+from players import Player, SearchStopped
+
+# How often, in milliseconds, the window checks whether the AI has chosen its move and updates
+# how far its search has got
+_POLL_MS = 50
 
 
 class VisualizedConnect4:
     """
     A class that handles the visualization for the given Connect4Game.
 
+    The game is played entirely by callbacks from tkinter's event loop, so the window does no
+    work while it waits for a player. Each turn starts in self._start_turn. A human's turn ends
+    when one of the on_colN_click handlers receives a click on a valid column. An AI's turn ends
+    when self._poll_search finds that the move the AI chose in another thread is ready. Either
+    way the move is played by self._play_move, which starts the next turn.
+
     Representation Invariants:
         - self._window is a valid instance of tkinter.TK (should not be a closed window)
         - self._board is a 6x7 2d array that represents the state of the game board
-        - self._human_move is an int between 0 and 6, inclusive, or None
+        - self._current_player is self._red or self._current_player is self._yellow
+        - If self._awaiting_human is True, then self._current_player.is_human
         - If self._is_replay is True, then self._exit_flag is True
+        - self._search_thread is None or self._search_player is not None
     """
     # Private Instance Attributes:
     #   - _window:
@@ -48,26 +61,63 @@ class VisualizedConnect4:
     #   - _board:
     #       The 2d array that represents the current state of the game board.
     #       This array is always 6x7 in size and the value at each slot if 0 or -1 or 1.
-    #   - _human_move:
-    #       The move that a HumanPlayer just made. Normally, this attribute is None.
-    #       When the HumanPlayer selects a move, it is an int between 0 and 6.
+    #   - _red:
+    #       The red player of the game.
+    #   - _yellow:
+    #       The yellow player of the game.
+    #   - _current_player:
+    #       The player whose turn it is.
+    #   - _no_human:
+    #       Boolean value indicating that the game is being watched rather than played, so
+    #       there are no buttons, and there are pauses after every move and at the end.
+    #   - _awaiting_human:
+    #       Boolean value indicating that it is a HumanPlayer's turn and the game is waiting
+    #       for them to click on a column. Clicks at any other time are ignored.
+    #   - _turn_text:
+    #       The canvas text item that says whose turn it is, or None if there is none.
+    #   - _progress_text:
+    #       The canvas text item that shows how far the AI's search has got, or None if there
+    #       is none.
     #   - _exit_flag:
     #       Boolean value indicating that the quit or replay button has been pressed.
     #       True when the quit or replay button has been pressed and False otherwise.
     #   - is_replay:
     #       Boolean value indicating that the replay button has been pressed.
     #       True when the replay button has been pressed and False otherwise
+    #   - _search_thread:
+    #       The thread the AI player whose turn it is chooses its move in, or None if no AI is
+    #       choosing a move. The AI never chooses its move in the tkinter thread, so that the
+    #       window can still be drawn, moved and closed while it is searching.
+    #   - _search_player:
+    #       The player choosing its move in self._search_thread, or None if there is none.
+    #   - _search_result:
+    #       The move chosen in self._search_thread, or None if it has not chosen one yet or was
+    #       stopped before it did.
+    #   - _search_error:
+    #       The exception raised while choosing the move in self._search_thread, or None if
+    #       there was none. The game is ended and it is raised again by __init__.
     _window: tkinter.Tk
     _game: Connect4Game
     _canvas: tkinter.Canvas
     _board: np.array
-    _human_move: Optional[int]
+    _red: Player
+    _yellow: Player
+    _current_player: Player
+    _no_human: bool
+    _awaiting_human: bool
+    _turn_text: Optional[int]
+    _progress_text: Optional[int]
     _exit_flag: bool
     is_replay: bool
+    _search_thread: Optional[threading.Thread]
+    _search_player: Optional[Player]
+    _search_result: Optional[int]
+    _search_error: Optional[Exception]
 
     def __init__(self, window: tkinter.Tk, red: Player, yellow: Player,
                  board: list[list[int]] = None, no_buttons: bool = None) -> None:
-        """Initialize a new visualized connect 4 game starting at the board state provided by board
+        """Initialize a new visualized connect 4 game starting at the board state provided by board,
+        and play it in window's event loop until the game is over and the window is closed.
 
         If board is None, the game starts with an empty board.
         If no_human is True, both players, red and yellow, are not instances if HumanPlayer
@@ -98,17 +148,21 @@ class VisualizedConnect4:
         # self._exit_flag and self._is_replay are both False by default
         self._exit_flag = False
         self.is_replay = False
+        self._search_thread = None
+        self._search_player = None
+        self._search_result = None
+        self._search_error = None
 
         # check whether a human is playing the game
         if no_buttons is None:
-            no_human = not red.is_human and not yellow.is_human
+            self._no_human = not red.is_human and not yellow.is_human
         else:
-            no_human = no_buttons
+            self._no_human = no_buttons
 
         self._window.protocol('WM_DELETE_WINDOW', self.quit)
 
         # If a human is playing the game, create quit and replay buttons
-        if not no_human:
+        if not self._no_human:
             button_quit = tkinter.Button(self._canvas, text='Quit', command=self.quit)
             button_quit.place(x=600, y=40)
             button_replay = tkinter.Button(self._canvas, text='Replay', command=self.replay)
@@ -125,90 +179,20 @@ class VisualizedConnect4:
         self._draw_board()
         self._update_board()
 
-        current_player = red
-        self._human_move = None
-
-        if not self._exit_flag:
-            self._window.update()
-            self._window.update_idletasks()
-            self._canvas.update()
-            self._canvas.update_idletasks()
-
-        # While no winner has been decided, keep making moves
-        while self._game.get_winner() is None:
-
-            # If the current_player is HumanPlayer, take move as the click input
-            # otherwise, call the make_move function on the respective player
-            # print(self._board.evaluate_score())
-            if current_player.is_human:
-                text = self._canvas.create_text(100, 20, font='Times 20 italic bold',
-                                                text="Human's Turn")
-                self._canvas.update()
-                move = self._check_input()
-            else:
-                text = self._canvas.create_text(100, 20, font='Times 20 italic bold',
-                                                text="AI is thinking")
-                self._canvas.update()
-                move = current_player.make_move(self._game.get_game_board())
-                self._canvas.delete(text)
-                self._window.update()
-
-            if move is None:
-                break
-
-            # Do not make move until the received move is valid
-            while move not in self._game.get_valid_moves():
-                if self._exit_flag:
-                    break
-                if current_player.is_human:
-                    move = self._check_input()
-                else:
-                    move = current_player.make_move(self._game.get_game_board())
-
-            if not self._exit_flag:
-                self._canvas.delete(text)
-                self._game.make_move(move)
-
-            # switch players every turn
-            if current_player is red:
-                current_player = yellow
-            else:
-                current_player = red
+        self._red = red
+        self._yellow = yellow
+        self._current_player = red
+        self._awaiting_human = False
+        self._turn_text = None
+        self._progress_text = None
 
-            if not self._exit_flag:
-                self._update_board()
-                self._window.update()
-                self._canvas.update()
-            else:
-                break
+        # The whole game is played by callbacks from the event loop, which returns once the
+        # window is closed
+        self._window.after_idle(self._start_turn)
+        self._window.mainloop()
 
-            # add a delay if no human is playing the game
-            if no_human:
-                time.sleep(.1)
-
-        if not self._exit_flag:
-            self._update_board()
-
-        # indicate winner
-        if self._game.get_winner() == 1:
-            self._canvas.create_text(100, 20, font='Times 20 italic bold',
-                                     text="Red Wins")
-            self._canvas.update()
-        elif self._game.get_winner() == -1:
-            self._canvas.create_text(100, 20, font='Times 20 italic bold',
-                                     text="Yellow Wins")
-            self._canvas.update()
-        elif self._game.get_winner() == 0:
-            self._canvas.create_text(100, 20, font='Times 20 italic bold',
-                                     text="Tie")
-            self._canvas.update()
-
-        # keep the win screen up for a little longer
-        if no_human and not self._exit_flag:
-            time.sleep(.8)
-            self._window.destroy()
-        elif not self._exit_flag:
-            self._window.mainloop()
+        if self._search_error is not None:
+            raise self._search_error
 
     def get_exit_flag(self) -> bool:
         """A function that returns whether the game window was closed or not"""
@@ -227,20 +211,161 @@ class VisualizedConnect4:
         """
         return self._game.get_move_sequence()
 
-    def _check_input(self) -> Optional[int]:
-        """A function that returns the human input (click) made on the column
+    def _start_turn(self) -> None:
+        """Start the turn of self._current_player, or show the result if the game is over.
+
+        If the current player is a HumanPlayer, the game waits for them to click on a column.
+        Otherwise, the AI starts choosing its move in another thread.
+        """
+        if self._exit_flag:
+            return
+        if self._game.get_winner() is not None:
+            self._end_game()
+        elif self._current_player.is_human:
+            self._turn_text = self._canvas.create_text(100, 20, font='Times 20 italic bold',
+                                                       text="Human's Turn")
+            self._awaiting_human = True
+        else:
+            self._turn_text = self._canvas.create_text(100, 20, font='Times 20 italic bold',
+                                                       text="AI is thinking")
+            self._progress_text = self._canvas.create_text(100, 50, font='Times 12 italic',
+                                                           text='')
+            self._start_search()
+
+    def _play_move(self, move: int) -> None:
+        """Play 'move' for self._current_player, and start the next player's turn.
+
+        Preconditions:
+            - move in self._game.get_valid_moves()
+        """
+        self._awaiting_human = False
+        self._canvas.delete(self._turn_text)
+        self._turn_text = None
+        if self._progress_text is not None:
+            self._canvas.delete(self._progress_text)
+            self._progress_text = None
+
+        self._game.make_move(move)
+        self._update_board()
+
+        # switch players every turn
+        if self._current_player is self._red:
+            self._current_player = self._yellow
+        else:
+            self._current_player = self._red
+
+        # add a delay if no human is playing the game
+        if self._no_human:
+            self._window.after(100, self._start_turn)
+        else:
+            self._window.after_idle(self._start_turn)
+
+    def _end_game(self) -> None:
+        """Show the winner of the game. If no human is playing, the window is closed after a
+        short delay. Otherwise, it stays open until the quit or replay button is pressed.
 
-        Returns the number of the column that was clicked on
-        Returns None if no click has been made
+        Preconditions:
+            - self._game.get_winner() is not None
         """
-        while self._human_move is None:
+        # indicate winner
+        if self._game.get_winner() == 1:
+            self._canvas.create_text(100, 20, font='Times 20 italic bold',
+                                     text="Red Wins")
+        elif self._game.get_winner() == -1:
+            self._canvas.create_text(100, 20, font='Times 20 italic bold',
+                                     text="Yellow Wins")
+        else:
+            self._canvas.create_text(100, 20, font='Times 20 italic bold',
+                                     text="Tie")
+
+        # keep the win screen up for a little longer
+        if self._no_human:
+            self._window.after(800, self._window.destroy)
+
+    def _on_column_click(self, column: int) -> None:
+        """Play a move in 'column' if a HumanPlayer is being waited for and the column is not
+        full. Otherwise, the click is ignored.
+
+        Preconditions:
+            - 0 <= column < 7
+        """
+        if self._awaiting_human and not self._exit_flag \
+                and column in self._game.get_valid_moves():
+            self._play_move(column)
+
+    def _start_search(self) -> None:
+        """Start self._current_player choosing its move on a copy of the board in another thread,
+        and check on it every _POLL_MS milliseconds with self._poll_search.
+
+        Preconditions:
+            - not self._current_player.is_human
+            - self._search_thread is None
+        """
+        self._search_player = self._current_player
+        self._search_result = None
+        self._search_thread = threading.Thread(target=self._search,
+                                               args=(self._current_player,
+                                                     self._game.get_game_board().copy()),
+                                               daemon=True)
+        self._search_thread.start()
+        self._window.after(_POLL_MS, self._poll_search)
+
+    def _search(self, player: Player, board: Board) -> None:
+        """Store the move 'player' chooses on 'board' in self._search_result. This is run in
+        self._search_thread, so it must not use the window.
+        """
+        try:
+            self._search_result = player.make_move(board)
+        except SearchStopped:
+            pass
+        except Exception as error:
+            self._search_error = error
+
+    def _poll_search(self) -> None:
+        """Play the move chosen in self._search_thread if it has finished. Otherwise, show the
+        depth and number of boards searched so far, and check again in _POLL_MS milliseconds.
+
+        If the AI chose a move that can not be played, it is asked to choose again. If choosing
+        the move raised an exception, the game is ended so that __init__ can raise it.
+
+        If the replay button has been pressed, the search is stopped again instead of shown, and
+        the window is closed once the thread has finished, so that the next game does not start
+        while the player is still searching.
+        """
+        if self._search_thread is None:
+            return
+        if self._search_thread.is_alive():
             if self._exit_flag:
-                return None
+                # stop only affects a search that has started, so it is called again in case the
+                # thread had not started searching when the replay button was pressed
+                self._search_player.stop()
             else:
-                self._window.update()
-        move_copy = self._human_move
-        self._human_move = None
-        return move_copy
+                search_progress = self._search_player.get_progress()
+                if search_progress is not None:
+                    depth, nodes = search_progress
+                    self._canvas.itemconfigure(self._progress_text,
+                                               text=f'depth {depth}, {nodes:,} boards')
+            self._window.after(_POLL_MS, self._poll_search)
+            return
+
+        self._search_thread = None
+        self._search_player = None
+        if self._search_error is not None or self._exit_flag:
+            self._exit_flag = True
+            self._window.quit()
+            self._window.destroy()
+        elif self._search_result in self._game.get_valid_moves():
+            self._play_move(self._search_result)
+        else:
+            self._start_search()
+
+    def _stop_search(self) -> None:
+        """Stop the AI choosing its move in self._search_thread, if there is one, and stop both
+        players pondering. This does not wait for them to stop, and players that can not be
+        stopped keep choosing their move until they are done.
+        """
+        self._red.stop()
+        self._yellow.stop()
 
     def _draw_board(self) -> None:
         """A function that draws the game board on the canvas"""
@@ -275,59 +400,71 @@ class VisualizedConnect4:
         Triggered by the activation of the quit button
         """
         self._exit_flag = True
+        self.is_replay = False
+        self._stop_search()
         self._window.quit()
         self._window.destroy()
 
     def replay(self) -> None:
         """A function that exits the game and allows for replay of a fresh game
         triggered by the activation of the replay button
+
+        If an AI is choosing its move, the window is closed by self._poll_search once it has
+        stopped, as the same players are used for the next game. The window keeps responding
+        until then.
         """
+        if self._exit_flag:
+            return
         self._exit_flag = True
         self.is_replay = True
-        self._window.quit()
-        self._window.destroy()
+        self._stop_search()
+        if self._search_thread is None:
+            self._window.quit()
+            self._window.destroy()
+        else:
+            self._canvas.itemconfigure(self._progress_text, text='stopping the search...')
 
     def on_col1_click(self, event) -> None:
-        """A function that records the click input of the human
+        """A function that passes the click input of the human to the game
         Triggered by the click of the first column on the game board
         """
-        self._human_move = 0
+        self._on_column_click(0)
 
     def on_col2_click(self, event) -> None:
-        """A function that records the click input of the human
+        """A function that passes the click input of the human to the game
         Triggered by the click of the second column on the game board
         """
-        self._human_move = 1
+        self._on_column_click(1)
 
     def on_col3_click(self, event) -> None:
-        """A function that records the click input of the human
+        """A function that passes the click input of the human to the game
         Triggered by the click of the third column on the game board
         """
-        self._human_move = 2
+        self._on_column_click(2)
 
     def on_col4_click(self, event) -> None:
-        """A function that records the click input of the human
+        """A function that passes the click input of the human to the game
         Triggered by the click of the fourth column on the game board
         """
-        self._human_move = 3
+        self._on_column_click(3)
 
     def on_col5_click(self, event) -> None:
-        """A function that records the click input of the human
+        """A function that passes the click input of the human to the game
         Triggered by the click of the fifth column on the game board
         """
-        self._human_move = 4
+        self._on_column_click(4)
 
     def on_col6_click(self, event) -> None:
-        """A function that records the click input of the human
+        """A function that passes the click input of the human to the game
         Triggered by the click of the sixth column on the game board
         """
-        self._human_move = 5
+        self._on_column_click(5)
 
     def on_col7_click(self, event) -> None:
-        """A function that records the click input of the human
+        """A function that passes the click input of the human to the game
         Triggered by the click of the seventh column on the game board
         """
-        self._human_move = 6
+        self._on_column_click(6)
 
 
 def add_game(game_tree: nx.DiGraph, root, game_sequence: list[int], variant) -> None:
@@ -571,8 +708,8 @@ if __name__ == '__main__':
 
     import python_ta
     python_ta.check_all(config={
-        'extra-imports': ['tkinter', 'connect4', 'players', 'typing',
-                          'numpy', 'networkx', 'time', 'matplotlib.pyplot'],
+        'extra-imports': ['tkinter', 'connect4', 'players', 'typing', 'board', 'threading',
+                          'numpy', 'networkx', 'matplotlib.pyplot'],
         # the names (strs) of imported modules
         'allowed-io': ['run_games'],
         # the names (strs) of functions that call print/open/input